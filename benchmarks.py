@@ -0,0 +1,248 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import contextlib
+import subprocess
+import numpy as np
+import pandas as pd
+from consumption_model import ConsumptionModel
+import create_CSV
+import flight_logs
+import plot_data
+from simulated_tello import SimulatedTello
+from tello_battery_tracker_astar import plan_path
+
+results_file = './benchmark_results.json'
+baseline_file = './benchmark_baseline.json'
+
+# A benchmark regresses when it takes more than (1 + regression_threshold) times its baseline.
+regression_threshold = 0.25
+
+# Workload sizes. --quick runs the first size of each list only.
+astar_sizes = [10, 20, 40, 80]
+flight_counts = [100, 10000, 100000]
+predict_calls = 10000
+legacy_flights = 100
+
+# Cold starts of the headless CLI, each run in a fresh interpreter, and the time they should stay under.
+cli_commands = [['plan', '5', '3', '2'], ['simulate', 'takeoff', 'up', 'forward', 'land']]
+cli_startup_budget = 0.1
+
+# Best of repeat wall-clock timings of function(), in seconds.
+def measure(function, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+# Runs function in a temporary working directory (with the folder the plot functions write to),
+# so generated logs and figures never touch the project tree.
+@contextlib.contextmanager
+def scratch_directory():
+    previous = os.getcwd()
+    folder = tempfile.mkdtemp(prefix='drone_benchmarks_')
+    os.makedirs(os.path.join(folder, 'average_battery_consumption'))
+    os.chdir(folder)
+    try:
+        yield folder
+    finally:
+        os.chdir(previous)
+        shutil.rmtree(folder, ignore_errors=True)
+
+# Open-space searches from one corner of a size x size x size/2 box to the other.
+def benchmark_astar(battery_consumption, sizes):
+    results = {}
+    for size in sizes:
+        bounds = (size, size, max(size // 2, 1))
+        goal = (bounds[0] - 1, bounds[1] - 1, bounds[2] - 1, 2)
+        path, expanded = plan_path((0, 0, 0, 0), goal, battery_consumption, bounds=bounds)
+        seconds = measure(lambda: plan_path((0, 0, 0, 0), goal, battery_consumption, bounds=bounds))
+        results[f'astar_search/{size}'] = {'seconds': seconds, 'expanded': expanded, 'path_length': len(path)}
+    return results
+
+# predict_next_move calls from a fixed position once the cost-to-go field is cached.
+def benchmark_predict(battery_consumption, calls):
+    drone = SimulatedTello(battery_consumption)
+    drone.takeoff()
+    drone.destination = (30, 20, 5)
+    drone.predict_next_move()
+
+    def run():
+        for _ in range(calls):
+            drone.predict_next_move()
+    seconds = measure(run)
+    return {f'predict_next_move/{calls}': {'seconds': seconds, 'calls_per_second': calls / seconds}}
+
+# Wall-clock time of whole drone_cli.py runs, including interpreter startup and imports, next to
+# a bare interpreter for reference. The first run warms the cost table cache.
+def benchmark_cli_startup(commands=cli_commands, repeat=5):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'drone_cli.py')
+    results = {}
+    runs = [('python', [sys.executable, '-c', 'pass'])]
+    runs += [(command[0], [sys.executable, script] + command) for command in commands]
+    for name, arguments in runs:
+        subprocess.run(arguments, capture_output=True, check=True)
+        seconds = measure(lambda: subprocess.run(arguments, capture_output=True), repeat)
+        results[f'cli_startup/{name}'] = {'seconds': seconds, 'budget_seconds': cli_startup_budget}
+    return results
+
+# The original per-flight simulate_drone loop, and the batched generator at each flight count.
+def benchmark_generation(counts):
+    results = {}
+    with scratch_directory(), contextlib.redirect_stdout(io.StringIO()):
+        def legacy():
+            for flight in range(1, legacy_flights + 1):
+                create_CSV.simulate_drone(create_CSV.commands_battery, flight)
+        seconds = measure(legacy, repeat=1)
+    results[f'simulate_drone/{legacy_flights}'] = {'seconds': seconds, 'flights_per_second': legacy_flights / seconds}
+    for count in counts:
+        seconds = measure(lambda: create_CSV.simulate_flights(create_CSV.commands_battery, count, seed=0))
+        results[f'simulate_flights/{count}'] = {'seconds': seconds, 'flights_per_second': count / seconds}
+    return results
+
+# Writes count generated flights as logs under folder: one CSV per flight like the test data up
+# to 10k flights, sharded CSVs beyond that.
+def write_logs(folder, count):
+    output_format = 'flights' if count <= 10000 else 'csv'
+    num_shards = 1 if count <= 10000 else 16
+    prefix = os.path.join(folder, 'battery_consumption_data')
+    with create_CSV.FlightWriter(prefix, output_format, num_shards) as writer:
+        for batch in create_CSV.iter_flight_batches(create_CSV.commands_battery, count, seed=0):
+            writer.write(*batch)
+
+# The loader read_csvs replaced: one plain pd.read_csv per log in turn, then a single concat.
+def read_csvs_serial(folder):
+    file_paths, _ = flight_logs.find_logs(folder)
+    return pd.concat([pd.read_csv(path) for path in file_paths], ignore_index=True)
+
+# read_csvs (next to the serial loader it replaced, with its speedup over it) and every plot_data
+# figure at each flight count. A stage that fails (e.g. static image export without kaleido) is
+# recorded with its error instead of a time.
+def benchmark_plots(counts):
+    results = {}
+    for count in counts:
+        with scratch_directory() as folder, contextlib.redirect_stdout(io.StringIO()):
+            logs = os.path.join(folder, 'battery_consumption')
+            os.makedirs(logs)
+            write_logs(logs, count)
+            df = plot_data.read_csvs(logs)
+            stages = [('read_csvs_serial', lambda: read_csvs_serial(logs)),
+                      ('read_csvs', lambda: plot_data.read_csvs(logs)),
+                      ('plot_drone_motion', lambda: plot_data.plot_drone_motion(df)),
+                      ('plot_battery_consumption', lambda: plot_data.plot_battery_consumption(df)),
+                      ('average_battery_consumption', lambda: plot_data.average_battery_consumption(df)),
+                      ('plot_average_battery_consumption',
+                       lambda: plot_data.plot_average_battery_consumption(plot_data.average_battery_consumption(df)))]
+            for name, stage in stages:
+                try:
+                    results[f'{name}/{count}'] = {'seconds': measure(stage, repeat=1 if count > 10000 else 3), 'rows': len(df)}
+                except Exception as error:
+                    message = (str(error).strip().splitlines() or [''])[0]
+                    results[f'{name}/{count}'] = {'error': f'{type(error).__name__}: {message}'}
+            serial, pooled = results[f'read_csvs_serial/{count}'], results[f'read_csvs/{count}']
+            if 'seconds' in serial and 'seconds' in pooled:
+                pooled['speedup'] = serial['seconds'] / pooled['seconds']
+    return results
+
+def run_benchmarks(quick=False):
+    battery_consumption = ConsumptionModel.load()
+    sizes = astar_sizes[:1] if quick else astar_sizes
+    counts = flight_counts[:1] if quick else flight_counts
+    results = {}
+    results.update(benchmark_astar(battery_consumption, sizes))
+    results.update(benchmark_predict(battery_consumption, predict_calls))
+    results.update(benchmark_cli_startup())
+    results.update(benchmark_generation(counts))
+    results.update(benchmark_plots(counts))
+    return {'environment': {'python': platform.python_version(), 'numpy': np.__version__,
+                            'platform': platform.platform(), 'processor': platform.processor()},
+            'results': results}
+
+# Benchmarks slower than their baseline by more than threshold, as (name, seconds, baseline).
+def find_regressions(report, baseline, threshold=regression_threshold):
+    regressions = []
+    for name, result in report['results'].items():
+        reference = baseline['results'].get(name, {})
+        if 'seconds' in result and 'seconds' in reference and result['seconds'] > reference['seconds'] * (1 + threshold):
+            regressions.append((name, result['seconds'], reference['seconds']))
+    return regressions
+
+# Benchmarks that fail now but were timed in the baseline, as (name, error).
+def find_failures(report, baseline):
+    return [(name, result['error']) for name, result in report['results'].items()
+            if 'error' in result and 'seconds' in baseline['results'].get(name, {})]
+
+# Benchmarks over their own time budget (e.g. the CLI cold start), as (name, seconds, budget).
+def find_over_budget(report):
+    return [(name, result['seconds'], result['budget_seconds']) for name, result in report['results'].items()
+            if 'seconds' in result and result['seconds'] > result.get('budget_seconds', float('inf'))]
+
+def print_report(report, baseline=None):
+    for name, result in report['results'].items():
+        if 'error' in result:
+            print(f'{name:<42} skipped ({result["error"]})')
+            continue
+        line = f'{name:<42} {result["seconds"] * 1000:>10.2f} ms'
+        reference = (baseline or {'results': {}})['results'].get(name, {})
+        if 'seconds' in reference:
+            line += f'  ({result["seconds"] / reference["seconds"]:.2f}x baseline)'
+        if 'speedup' in result:
+            line += f'  {result["speedup"]:.1f}x faster than serial'
+        if result['seconds'] > result.get('budget_seconds', float('inf')):
+            line += f'  over {result["budget_seconds"] * 1000:.0f} ms budget'
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the planner, predictor, generator and plot pipeline.')
+    parser.add_argument('--quick', action='store_true', help='smallest workload of each benchmark only')
+    parser.add_argument('--output', default=results_file)
+    parser.add_argument('--baseline', default=baseline_file)
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=regression_threshold)
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.quick)
+    with open(args.output, mode='w') as file:
+        json.dump(report, file, indent=2)
+
+    baseline = None
+    if os.path.isfile(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    print_report(report, baseline)
+
+    # Budgets hold with or without a baseline. Without a baseline nothing else was checked, so that
+    # fails as well rather than passing quietly.
+    problems = [f'OVER BUDGET {name}: {seconds * 1000:.2f} ms vs {budget * 1000:.0f} ms budget'
+                for name, seconds, budget in find_over_budget(report)]
+    if args.save_baseline:
+        with open(args.baseline, mode='w') as file:
+            json.dump(report, file, indent=2)
+        print(f'Baseline saved to {args.baseline}')
+    elif baseline is not None:
+        unchecked = [name for name, result in report['results'].items()
+                     if 'seconds' in result and 'seconds' not in baseline['results'].get(name, {})]
+        if unchecked:
+            print(f'WARNING not in the baseline, so not checked: {", ".join(unchecked)}', file=sys.stderr)
+        problems += [f'REGRESSION {name}: {seconds * 1000:.2f} ms vs {reference * 1000:.2f} ms baseline'
+                     for name, seconds, reference in find_regressions(report, baseline, args.threshold)]
+        problems += [f'FAILED {name}: {error} (timed in the baseline)' for name, error in find_failures(report, baseline)]
+    for problem in problems:
+        print(problem)
+    if problems:
+        sys.exit(1)
+    if baseline is None and not args.save_baseline:
+        print(f'WARNING no baseline at {args.baseline}, so nothing was checked for regressions; '
+              f'record one with --save-baseline', file=sys.stderr)
+        sys.exit(2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import os
+import csv
+import numpy as np
+from drone_commands import commands, command_ids
+
+# 'up' was not included in the test flights, so its consumption is hard coded here and used
+# whenever the data has no value for it.
+untested_consumption = {'up': 1.01}
+
+quantile_levels = np.array([0.05, 0.25, 0.5, 0.75, 0.95])
+
+csv_file = './average_battery_consumption/average_battery_data.csv'
+
+# Per-command battery consumption (%) held in arrays indexed by command id. Indexing the model
+# with a command name returns its mean, so it can stand in for the old command_battery dicts.
+# std and quantiles are NaN when the source only had averages.
+class ConsumptionModel:
+    def __init__(self, mean, std=None, quantiles=None):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.std = np.full(len(commands), np.nan) if std is None else np.asarray(std, dtype=np.float64)
+        if quantiles is None:
+            quantiles = np.full((len(commands), len(quantile_levels)), np.nan)
+        self.quantiles = np.asarray(quantiles, dtype=np.float64)
+        self.costs = self.mean.tolist()
+
+    def __getitem__(self, command):
+        return self.costs[command_ids[command]]
+
+    def __contains__(self, command):
+        return command in command_ids
+
+    def keys(self):
+        return list(commands)
+
+    def as_dict(self):
+        return dict(zip(commands, self.costs))
+
+    def quantile(self, command, level):
+        return float(np.interp(level, quantile_levels, self.quantiles[command_ids[command]]))
+
+    # Builds a model from average_battery_data.csv. Only the means are available there.
+    @classmethod
+    def from_csv(cls, filename=csv_file):
+        mean = np.full(len(commands), np.nan)
+        with open(filename, newline='') as file:
+            reader = csv.reader(file)
+            next(reader)
+            for command, consumption in reader:
+                if command in command_ids:
+                    mean[command_ids[command]] = float(consumption)
+        return cls(fill_untested(mean))
+
+    # Builds a model with full statistics from a frame of flight logs as returned by
+    # flight_logs.read_csvs.
+    @classmethod
+    def from_frame(cls, df):
+        mean = np.full(len(commands), np.nan)
+        std = np.full(len(commands), np.nan)
+        quantiles = np.full((len(commands), len(quantile_levels)), np.nan)
+        consumption = df['Battery Consumption (%)'].astype(np.float64)
+        for command, values in consumption.groupby(df['Command'].astype(str)):
+            if command in command_ids:
+                values = values.to_numpy()
+                mean[command_ids[command]] = values.mean()
+                std[command_ids[command]] = values.std(ddof=1) if len(values) > 1 else 0.0
+                quantiles[command_ids[command]] = np.quantile(values, quantile_levels)
+        return cls(fill_untested(mean), std, quantiles)
+
+    def save(self, filename):
+        with open(filename, 'wb') as file:
+            np.savez(file, mean=self.mean, std=self.std, quantiles=self.quantiles)
+
+    @classmethod
+    def from_cache(cls, filename):
+        with np.load(filename) as data:
+            return cls(data['mean'], data['std'], data['quantiles'])
+
+    # Loads the model for average_battery_data.csv from its binary cache, rebuilding the cache
+    # from the CSV when it is missing or older than the CSV.
+    @classmethod
+    def load(cls, filename=csv_file, cache_file=None):
+        cache_file = cache_file or cache_filename(filename)
+        if os.path.isfile(cache_file) and os.path.getmtime(cache_file) >= os.path.getmtime(filename):
+            return cls.from_cache(cache_file)
+        model = cls.from_csv(filename)
+        try:
+            model.save(cache_file)
+        except OSError:
+            pass
+        return model
+
+def cache_filename(filename):
+    return os.path.splitext(filename)[0] + '.npz'
+
+def fill_untested(mean):
+    for command, consumption in untested_consumption.items():
+        if np.isnan(mean[command_ids[command]]):
+            mean[command_ids[command]] = consumption
+    missing = [command for command, value in zip(commands, mean) if np.isnan(value)]
+    if missing:
+        raise ValueError(f"No battery consumption data for: {', '.join(missing)}")
+    return mean
@@ -0,0 +1,260 @@
+import os
+import sys
+import math
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from drone_commands import commands, command_ids
+from flight_logs import command_dtype, find_logs
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+log_folder = './battery_consumption'
+quantiles_file = './average_battery_consumption/consumption_quantiles.csv'
+sketch_file = './average_battery_consumption/consumption_sketch.npz'
+
+# Rows read from a log at a time. Memory use is one chunk plus the sketch, whatever the log size.
+chunk_rows = 1000000
+
+# t-digest size: about this many centroids per command, more for finer tail quantiles. Raw
+# values are buffered until digest_buffer of them are waiting, then folded in.
+digest_compression = 200
+digest_buffer = 100000
+
+# Fixed histogram bins shared by every sketch so histograms always merge: histogram_bins bins of
+# histogram_width % each from 0. Values beyond the last bin are counted in it.
+histogram_width = 0.01
+histogram_bins = 1000
+
+report_quantiles = (0.5, 0.95, 0.99)
+
+# Merging t-digest (Dunning & Ertl) over weighted centroids. Compressing sorts the centroids and
+# pools every run that falls within one unit of the k1 scale function k(q) = c/2pi * asin(2q - 1),
+# which keeps centroids small near q = 0 and 1 so the tail quantiles stay accurate. Two digests
+# merge by compressing their centroids together. The exact minimum and maximum are kept to
+# anchor the ends.
+class TDigest:
+    def __init__(self, compression=digest_compression):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.pending = []
+        self.pending_size = 0
+
+    def add(self, values, weights=None):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+        self.pending.append((values, np.ones(len(values)) if weights is None else np.asarray(weights, dtype=np.float64)))
+        self.pending_size += len(values)
+        if self.pending_size >= digest_buffer:
+            self.compress()
+
+    def merge(self, other):
+        other.compress()
+        if len(other.means):
+            self.minimum = min(self.minimum, other.minimum)
+            self.maximum = max(self.maximum, other.maximum)
+            self.pending.append((other.means, other.weights))
+            self.pending_size += len(other.means)
+            self.compress()
+        return self
+
+    def compress(self):
+        if not self.pending:
+            return
+        means = np.concatenate([self.means] + [means for means, _ in self.pending])
+        weights = np.concatenate([self.weights] + [weights for _, weights in self.pending])
+        self.pending, self.pending_size = [], 0
+        order = np.argsort(means)
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights) / cumulative[-1]
+        k = self.compression / (2 * math.pi) * np.arcsin(np.clip(2 * q - 1, -1, 1))
+        groups = np.floor(k - k[0]).astype(np.int64)
+        starts = np.flatnonzero(np.diff(groups, prepend=-1))
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    @property
+    def count(self):
+        self.compress()
+        return float(self.weights.sum())
+
+    # Interpolates between centroid centres, and from the outermost centres to the exact minimum
+    # and maximum.
+    def quantile(self, q):
+        self.compress()
+        if not len(self.means):
+            return np.full(np.shape(q), np.nan)
+        cumulative = np.cumsum(self.weights)
+        centres = cumulative - self.weights / 2
+        positions = np.concatenate(([0.0], centres, [cumulative[-1]]))
+        values = np.concatenate(([self.minimum], self.means, [self.maximum]))
+        return np.interp(np.asarray(q) * cumulative[-1], positions, values)
+
+# Mergeable per-command summary of battery consumption: counts, mean and sum of squared
+# deviations (merged as in plot_data.merge_stats), minimum and maximum, a fixed-bin histogram and
+# a t-digest. Its size depends only on the command table and the sketch settings, never on the
+# number of rows added.
+class CommandSketch:
+    def __init__(self, compression=digest_compression):
+        size = len(commands)
+        self.compression = compression
+        self.counts = np.zeros(size, dtype=np.int64)
+        self.means = np.zeros(size)
+        self.m2 = np.zeros(size)
+        self.minimum = np.full(size, np.inf)
+        self.maximum = np.full(size, -np.inf)
+        self.histograms = np.zeros((size, histogram_bins), dtype=np.int64)
+        self.digests = [TDigest(compression) for _ in commands]
+
+    # Adds rows given as command opcodes and their consumption.
+    def add(self, codes, consumption):
+        # uint8 opcodes sort by radix sort, in linear time.
+        codes = np.asarray(codes, dtype=np.uint8)
+        consumption = np.asarray(consumption, dtype=np.float64)
+        order = np.argsort(codes, kind='stable')
+        codes, consumption = codes[order], consumption[order]
+        present, starts = np.unique(codes, return_index=True)
+        ends = np.append(starts[1:], len(codes))
+        for code, start, end in zip(present.tolist(), starts.tolist(), ends.tolist()):
+            values = consumption[start:end]
+            mean = values.mean()
+            self.merge_moments(code, len(values), mean, float(((values - mean) ** 2).sum()))
+            self.minimum[code] = min(self.minimum[code], values.min())
+            self.maximum[code] = max(self.maximum[code], values.max())
+            bins = np.clip((values / histogram_width).astype(np.int64), 0, histogram_bins - 1)
+            self.histograms[code] += np.bincount(bins, minlength=histogram_bins)
+            self.digests[code].add(values)
+
+    def merge_moments(self, code, count, mean, m2):
+        total = self.counts[code] + count
+        if total == 0:
+            return
+        delta = mean - self.means[code]
+        self.m2[code] += m2 + delta * delta * self.counts[code] * count / total
+        self.means[code] += delta * count / total
+        self.counts[code] = total
+
+    def merge(self, other):
+        for code in np.flatnonzero(other.counts).tolist():
+            self.merge_moments(code, other.counts[code], other.means[code], other.m2[code])
+            self.digests[code].merge(other.digests[code])
+        self.minimum = np.minimum(self.minimum, other.minimum)
+        self.maximum = np.maximum(self.maximum, other.maximum)
+        self.histograms += other.histograms
+        return self
+
+    def quantiles(self, command, q=report_quantiles):
+        return self.digests[command_ids[command]].quantile(q)
+
+    # Histogram bin edges and counts for one command.
+    def histogram(self, command):
+        edges = np.arange(histogram_bins + 1) * histogram_width
+        return edges, self.histograms[command_ids[command]]
+
+    # One row per command seen: count, mean, sample standard deviation, minimum, the
+    # report_quantiles and maximum.
+    def summary(self, q=report_quantiles):
+        rows = []
+        for code in np.flatnonzero(self.counts).tolist():
+            count = int(self.counts[code])
+            std = math.sqrt(self.m2[code] / (count - 1)) if count > 1 else 0.0
+            rows.append([commands[code], count, self.means[code], std, self.minimum[code]]
+                        + self.digests[code].quantile(q).tolist() + [self.maximum[code]])
+        columns = ['Command', 'count', 'mean', 'std', 'min'] + [f'p{round(100 * value)}' for value in q] + ['max']
+        return pd.DataFrame(rows, columns=columns)
+
+    # Saves the sketch so partial sketches built elsewhere can be merged later.
+    def save(self, filename):
+        for digest in self.digests:
+            digest.compress()
+        sizes = [len(digest.means) for digest in self.digests]
+        np.savez(filename, compression=self.compression, counts=self.counts, means=self.means, m2=self.m2,
+                 minimum=self.minimum, maximum=self.maximum, histograms=self.histograms,
+                 digest_sizes=sizes,
+                 digest_means=np.concatenate([digest.means for digest in self.digests]),
+                 digest_weights=np.concatenate([digest.weights for digest in self.digests]))
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            sketch = cls(int(data['compression']))
+            sketch.counts, sketch.means, sketch.m2 = data['counts'], data['means'], data['m2']
+            sketch.minimum, sketch.maximum, sketch.histograms = data['minimum'], data['maximum'], data['histograms']
+            offsets = np.concatenate(([0], np.cumsum(data['digest_sizes'])))
+            for code, digest in enumerate(sketch.digests):
+                digest.means = data['digest_means'][offsets[code]:offsets[code + 1]]
+                digest.weights = data['digest_weights'][offsets[code]:offsets[code + 1]]
+                if sketch.counts[code]:
+                    digest.minimum, digest.maximum = float(sketch.minimum[code]), float(sketch.maximum[code])
+        return sketch
+
+# Yields (opcodes, consumption) arrays of at most chunk_size rows from one log. CSV and parquet
+# are streamed; an npz shard is decompressed whole, so its size is bounded by the shard size
+# chosen when it was written. Rows with commands outside the table are dropped.
+def iter_chunks(file_path, chunk_size=chunk_rows):
+    if file_path.endswith('.npz'):
+        with np.load(file_path) as data:
+            codes = np.array([command_ids[str(name)] for name in data['command_names']])[data['command']]
+            consumption = data['consumption']
+        for start in range(0, len(codes), chunk_size):
+            yield codes[start:start + chunk_size], consumption[start:start + chunk_size]
+    elif file_path.endswith('.parquet'):
+        if pq is None:
+            raise ImportError("Reading parquet requires pyarrow.")
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_size, columns=['Command', 'Battery Consumption (%)']):
+            names = pd.Series(batch.column(0).to_pandas()).astype(str).astype(command_dtype)
+            codes = names.cat.codes.to_numpy()
+            yield codes[codes >= 0], batch.column(1).to_numpy()[codes >= 0]
+    else:
+        reader = pd.read_csv(file_path, usecols=['Command', 'Battery Consumption (%)'], chunksize=chunk_size,
+                             dtype={'Command': command_dtype, 'Battery Consumption (%)': np.float64})
+        with reader:
+            for chunk in reader:
+                codes = chunk['Command'].cat.codes.to_numpy()
+                yield codes[codes >= 0], chunk['Battery Consumption (%)'].to_numpy()[codes >= 0]
+
+# Sketches a group of logs in one process.
+def sketch_files(file_paths, chunk_size=chunk_rows, compression=digest_compression):
+    sketch = CommandSketch(compression)
+    for file_path in file_paths:
+        for codes, consumption in iter_chunks(file_path, chunk_size):
+            sketch.add(codes, consumption)
+    return sketch
+
+# Sketches every log under folder_path. The logs are dealt round-robin into a few groups per
+# worker process, each worker returns one partial sketch, and the partial sketches are merged as
+# they arrive. max_workers=1 reads everything in this process.
+def sketch_logs(folder_path=log_folder, max_workers=None, chunk_size=chunk_rows, compression=digest_compression):
+    file_paths, _ = find_logs(folder_path)
+    if max_workers == 1 or len(file_paths) < 2:
+        return sketch_files(file_paths, chunk_size, compression)
+    num_groups = min(len(file_paths), 4 * (max_workers or os.cpu_count() or 1))
+    groups = [file_paths[group::num_groups] for group in range(num_groups)]
+    sketch = CommandSketch(compression)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for partial in executor.map(sketch_files, groups, [chunk_size] * num_groups, [compression] * num_groups):
+            sketch.merge(partial)
+    return sketch
+
+def main():
+    folder_path = sys.argv[1] if len(sys.argv) > 1 else log_folder
+    sketch = sketch_logs(folder_path)
+    summary = sketch.summary()
+    print(summary.to_string(index=False, float_format=lambda value: f'{value:.4f}'))
+    summary.to_csv(quantiles_file, index=False)
+    sketch.save(sketch_file)
+    from plot_data import plot_consumption_quantiles
+    plot_consumption_quantiles(summary)
+
+if __name__ == "__main__":
+    main()
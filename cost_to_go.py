@@ -0,0 +1,124 @@
+from collections import OrderedDict
+import numpy as np
+from drone_commands import commands, command_ids, command_delta_tuples
+
+# Moves that change the drone's (x, y, z) position. Turning and flipping cost battery without
+# bringing the drone any closer, so they never lower the cost to go.
+moves = [command for command in commands if any(command_delta_tuples[command_ids[command]][:3])]
+
+# Cells added around the destination and the drone on every side of a field's grid.
+field_margin = 8
+
+# Minimum battery (%) needed to fly from each cell of a box to a destination, as a float32 grid.
+# Cells that can't reach the destination hold inf.
+class CostToGoField:
+    def __init__(self, destination, origin, costs):
+        self.destination = tuple(destination)
+        self.origin = tuple(origin)
+        self.costs = costs
+
+    def contains(self, position):
+        return all(0 <= position[axis] - self.origin[axis] < self.costs.shape[axis] for axis in range(3))
+
+    def cost(self, position):
+        if not self.contains(position):
+            return float('inf')
+        return float(self.costs[position[0] - self.origin[0], position[1] - self.origin[1], position[2] - self.origin[2]])
+
+    @property
+    def nbytes(self):
+        return self.costs.nbytes
+
+# Relaxes costs against every move along one axis at once. A move of +1 along the axis costing
+# step_cost lets cell i reach any j > i for step_cost * (j - i), so the best of those is a running
+# minimum of costs[j] + step_cost * j taken from the far end; moves of -1 mirror this.
+# Blocked cells split each line into segments. segments holds every cell's segment number times a
+# separation larger than any real cost, so a running minimum never carries a cost across a blocked
+# cell; anything that did comes out at least half a separation too large and is discarded.
+def sweep_axis(costs, axis, step, step_cost, segments=None, separation=None):
+    shape = [1, 1, 1]
+    shape[axis] = costs.shape[axis]
+    ramp = step_cost * np.arange(costs.shape[axis], dtype=np.float64).reshape(shape)
+    if segments is not None:
+        ramp = ramp + segments
+    if step > 0:
+        reached = np.flip(np.minimum.accumulate(np.flip(costs + ramp, axis), axis=axis), axis) - ramp
+    else:
+        reached = np.minimum.accumulate(costs - ramp, axis=axis) + ramp
+    if segments is not None:
+        reached[reached >= separation / 2] = np.inf
+    np.minimum(costs, reached, out=costs)
+
+# Shortest-path sweep outwards from the destination over the box starting at origin with the
+# given shape, using each move's battery consumption as its cost. blocked is an optional boolean
+# mask of cells that can't be entered. Sweeps along every axis and direction are repeated until
+# nothing improves by more than rounding noise.
+def cost_to_go_field(destination, battery_consumption, origin, shape, blocked=None):
+    costs = np.full(shape, np.inf, dtype=np.float64)
+    goal = tuple(destination[axis] - origin[axis] for axis in range(3))
+    if all(0 <= goal[axis] < shape[axis] for axis in range(3)) and (blocked is None or not blocked[goal]):
+        costs[goal] = 0.0
+        steps = []
+        for move in moves:
+            delta = command_delta_tuples[command_ids[move]]
+            axis = next(axis for axis in range(3) if delta[axis])
+            steps.append((axis, delta[axis], battery_consumption[move]))
+        segments = [None, None, None]
+        separation = None
+        if blocked is not None and blocked.any():
+            separation = 2.0 * costs.size * max(step_cost for _, _, step_cost in steps) + 1.0
+            segments = [np.cumsum(blocked, axis=axis) * separation for axis in range(3)]
+        changed = True
+        while changed:
+            previous = costs.copy()
+            for axis, step, step_cost in steps:
+                sweep_axis(costs, axis, step, step_cost, segments[axis], separation)
+                if separation is not None:
+                    costs[blocked] = np.inf
+            changed = bool(np.any(costs < previous - 1e-6))
+    return CostToGoField(destination, origin, costs.astype(np.float32))
+
+# Least-recently-used cache of cost-to-go fields, one per destination, kept under max_bytes.
+# A field is rebuilt over a larger box when the drone wanders outside the one it was built for.
+# With an OccupancyGrid, fields cover the whole grid so detours around walls are found, and
+# blocked cells (and anything outside the grid) are avoided.
+class CostToGoCache:
+    def __init__(self, battery_consumption, max_bytes=64 * 1024 * 1024, margin=field_margin, grid=None):
+        self.battery_consumption = battery_consumption
+        self.grid = grid
+        self.max_bytes = max_bytes
+        self.margin = margin
+        self.fields = OrderedDict()
+        self.nbytes = 0
+
+    def field(self, destination, position):
+        destination = tuple(destination[:3])
+        field = self.fields.get(destination)
+        if field is not None and (self.grid is not None or field.contains(position)):
+            self.fields.move_to_end(destination)
+            return field
+
+        if self.grid is not None:
+            low, shape = self.grid.origin, self.grid.shape
+            blocked = self.grid.to_dense()
+        else:
+            low = [min(destination[axis], position[axis]) - self.margin for axis in range(3)]
+            high = [max(destination[axis], position[axis]) + self.margin for axis in range(3)]
+            shape = tuple(high[axis] - low[axis] + 1 for axis in range(3))
+            blocked = None
+        field = cost_to_go_field(destination, self.battery_consumption, tuple(low), shape, blocked)
+        self.store(destination, field)
+        return field
+
+    def store(self, destination, field):
+        if destination in self.fields:
+            self.nbytes -= self.fields.pop(destination).nbytes
+        self.fields[destination] = field
+        self.nbytes += field.nbytes
+        while self.nbytes > self.max_bytes and len(self.fields) > 1:
+            _, evicted = self.fields.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        self.fields.clear()
+        self.nbytes = 0
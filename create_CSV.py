@@ -1,5 +1,13 @@
 import csv
 import random
+import numpy as np
+from drone_commands import commands as command_names, command_ids, encode_commands
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
 
 # Define the list of drone commands and their corresponding battery consumption ranges (percentage per command)
 commands_battery = [
@@ -17,6 +25,23 @@ commands_battery = [
 # Define the number of simulations to run
 num_simulations = 100
 
+# Seed for the batched generator. None draws fresh entropy on every run.
+seed = None
+
+# Flights generated per batch. Commands are drawn block_commands at a time for the flights of a
+# batch that still have battery, so the intermediate arrays are at most batch_size x
+# block_commands however cheap the commands are.
+batch_size = 65536
+block_commands = 32
+
+# Output layout for generated flights: 'flights' writes one CSV per flight (the layout plot_data.py
+# reads), 'csv', 'npz' and 'parquet' write every flight into num_shards files with a flight_id column.
+output_format = 'flights'
+num_shards = 1
+
+takeoff_code = command_ids['takeoff']
+land_code = command_ids['land']
+
 # Initialize the CSV file for writing
 def initialize_csv(filename):
     with open(filename, mode='w', newline='') as file:
@@ -48,6 +73,184 @@ def simulate_drone(commands_battery, csv_number):
 
     print(f'Drone simulation completed. CSV file created: {filename}')
 
-# Run the simulations
-for csv_number in range(1, num_simulations + 1):
-    simulate_drone(commands_battery, csv_number)
+# Vectorized version of simulate_drone for many flights at once. Yields one
+# (commands, consumptions, offsets) batch at a time: commands holds the shared command opcodes,
+# consumptions the recorded battery use of each row, and flight i of the batch is rows
+# offsets[i]:offsets[i + 1]. Every flight starts with takeoff and ends with land, like the CSVs.
+def iter_flight_batches(commands_battery, num_flights, seed=None, batch_size=batch_size):
+    rng = np.random.default_rng(seed)
+    flight_commands = commands_battery[1:]  # Exclude takeoff and land
+    flight_codes = encode_commands([command for command, _ in flight_commands])
+    low = np.array([consumption[0] for _, consumption in flight_commands], dtype=np.float32)
+    width = np.array([consumption[1] - consumption[0] for _, consumption in flight_commands], dtype=np.float32)
+    if (low + width).max() <= 0:
+        raise ValueError("At least one command must consume battery, or no flight would ever end.")
+
+    for start in range(0, num_flights, batch_size):
+        size = min(batch_size, num_flights - start)
+        # Takeoff consumption is drawn from the first range, as in simulate_drone.
+        remaining = 100 - rng.uniform(*commands_battery[0][1], size=size)
+
+        # A flight keeps issuing commands while its battery is above zero, so it ends at the first
+        # command at which the running total reaches the battery left after takeoff. Each block
+        # draws the next block_commands commands of the flights still flying.
+        lengths = np.zeros(size, dtype=np.int64)
+        flying = np.arange(size)
+        blocks = []
+        while len(flying):
+            choices = rng.integers(0, len(flight_commands), size=(len(flying), block_commands), dtype=np.uint8)
+            consumption = low[choices] + width[choices] * rng.random((len(flying), block_commands), dtype=np.float32)
+            totals = np.cumsum(consumption, axis=1, dtype=np.float64)
+            below = (totals < remaining[flying, None]).sum(axis=1)
+            landing = below < block_commands
+            kept = np.where(landing, below + 1, block_commands)
+            blocks.append((flying, lengths[flying], choices, consumption, kept))
+            lengths[flying] += kept
+            remaining[flying] -= totals[:, -1]
+            flying = flying[~landing]
+        offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(lengths + 2, out=offsets[1:])
+
+        # A block's commands go after the flight's takeoff and the commands of its earlier blocks.
+        commands = np.empty(offsets[-1], dtype=np.uint8)
+        consumptions = np.empty(offsets[-1], dtype=np.float32)
+        columns = np.arange(block_commands)
+        for flights, before, choices, consumption, kept in blocks:
+            keep = columns < kept[:, None]
+            rows = (offsets[flights] + 1 + before)[:, None] + columns
+            commands[rows[keep]] = flight_codes[choices[keep]]
+            consumptions[rows[keep]] = consumption[keep]
+
+        commands[offsets[:-1]] = takeoff_code
+        consumptions[offsets[:-1]] = rng.integers(4, 6, size=size)
+        commands[offsets[1:] - 1] = land_code
+        consumptions[offsets[1:] - 1] = rng.integers(2, 4, size=size)
+        yield commands, consumptions, offsets
+
+# Generates num_flights flights in one set of arrays; see iter_flight_batches.
+def simulate_flights(commands_battery, num_flights, seed=None, batch_size=batch_size):
+    batches = list(iter_flight_batches(commands_battery, num_flights, seed, batch_size))
+    if not batches:
+        return np.empty(0, dtype=np.uint8), np.empty(0, dtype=np.float32), np.zeros(1, dtype=np.int64)
+    commands = np.concatenate([batch[0] for batch in batches])
+    consumptions = np.concatenate([batch[1] for batch in batches])
+    offsets = [batches[0][2]]
+    for batch in batches[1:]:
+        offsets.append(batch[2][1:] + offsets[-1][-1])
+    return commands, consumptions, np.concatenate(offsets)
+
+# Writes batches from iter_flight_batches to disk. Flight ids are assigned in order starting at 1.
+# Columnar formats keep one open output per shard and route flight i to shard i % num_shards;
+# npz can't be appended to, so its shards are buffered and saved on close.
+class FlightWriter:
+    extensions = {'flights': 'csv', 'csv': 'csv', 'npz': 'npz', 'parquet': 'parquet'}
+
+    def __init__(self, prefix='battery_consumption_data', output_format='csv', num_shards=1):
+        if output_format not in self.extensions:
+            raise ValueError(f"Unknown output format: {output_format}")
+        if output_format == 'parquet' and pa is None:
+            raise ImportError("Writing parquet requires pyarrow.")
+        if output_format == 'flights':
+            num_shards = 1
+        self.prefix = prefix
+        self.output_format = output_format
+        self.num_shards = num_shards
+        self.next_flight_id = 1
+        self.filenames = []
+        self.outputs = []
+        if output_format != 'flights':
+            for shard in range(num_shards):
+                filename = self.shard_filename(shard)
+                self.filenames.append(filename)
+                self.outputs.append(self.open_shard(filename))
+
+    def shard_filename(self, shard):
+        extension = self.extensions[self.output_format]
+        if self.num_shards == 1:
+            return f'{self.prefix}.{extension}'
+        return f'{self.prefix}_shard_{shard}.{extension}'
+
+    def open_shard(self, filename):
+        if self.output_format == 'csv':
+            file = open(filename, mode='w', newline='')
+            csv.writer(file).writerow(['flight_id', 'Command', 'Battery Consumption (%)'])
+            return file
+        if self.output_format == 'parquet':
+            schema = pa.schema([('flight_id', pa.uint32()),
+                                ('Command', pa.dictionary(pa.uint8(), pa.string())),
+                                ('Battery Consumption (%)', pa.float32())])
+            return pq.ParquetWriter(filename, schema)
+        return []
+
+    def write(self, commands, consumptions, offsets):
+        num_flights = len(offsets) - 1
+        flight_ids = np.arange(self.next_flight_id, self.next_flight_id + num_flights, dtype=np.uint32)
+        self.next_flight_id += num_flights
+        if self.output_format == 'flights':
+            self.write_flight_files(flight_ids, commands, consumptions, offsets)
+            return
+
+        row_flight_ids = np.repeat(flight_ids, np.diff(offsets))
+        for shard, output in enumerate(self.outputs):
+            if self.num_shards == 1:
+                rows = slice(None)
+            else:
+                rows = row_flight_ids % self.num_shards == shard
+            self.write_rows(output, row_flight_ids[rows], commands[rows], consumptions[rows])
+
+    def write_rows(self, output, flight_ids, commands, consumptions):
+        if self.output_format == 'csv':
+            # None of the fields need quoting, so the rows are joined directly rather than going
+            # through csv.writer one row at a time.
+            ids, first_rows = np.unique(flight_ids, return_index=True)
+            id_text = np.repeat(ids.astype(str).astype(object), np.diff(np.append(first_rows, len(flight_ids))))
+            names = np.array(command_names, dtype=object)[commands]
+            values = [f'{value:.7g}' for value in consumptions.tolist()]
+            if values:
+                output.write('\r\n'.join(map(','.join, zip(id_text.tolist(), names.tolist(), values))) + '\r\n')
+        elif self.output_format == 'parquet':
+            table = pa.table({'flight_id': flight_ids,
+                              'Command': pa.DictionaryArray.from_arrays(commands, command_names),
+                              'Battery Consumption (%)': consumptions})
+            output.write_table(table)
+        else:
+            output.append((flight_ids, commands, consumptions))
+
+    def write_flight_files(self, flight_ids, commands, consumptions, offsets):
+        names = np.array(command_names, dtype=object)[commands]
+        values = [f'{value:.7g}' for value in consumptions.tolist()]
+        for i, flight_id in enumerate(flight_ids):
+            rows = slice(offsets[i], offsets[i + 1])
+            filename = f'{self.prefix}_{flight_id}.csv'
+            with open(filename, mode='w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(['Command', 'Battery Consumption (%)'])
+                writer.writerows(zip(names[rows], values[rows]))
+            self.filenames.append(filename)
+
+    def close(self):
+        for filename, output in zip(self.filenames, self.outputs):
+            if self.output_format == 'npz':
+                np.savez(filename,
+                         flight_id=np.concatenate([part[0] for part in output] or [np.empty(0, np.uint32)]),
+                         command=np.concatenate([part[1] for part in output] or [np.empty(0, np.uint8)]),
+                         consumption=np.concatenate([part[2] for part in output] or [np.empty(0, np.float32)]),
+                         command_names=np.array(command_names))
+            else:
+                output.close()
+        self.outputs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def main():
+    with FlightWriter(output_format=output_format, num_shards=num_shards) as writer:
+        for commands, consumptions, offsets in iter_flight_batches(commands_battery, num_simulations, seed):
+            writer.write(commands, consumptions, offsets)
+    print(f'Drone simulations completed. {num_simulations} flights written to {len(writer.filenames)} file(s).')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import os
+import sys
+import marshal
+import argparse
+from drone_commands import commands, command_ids, command_methods
+
+# Headless entry point for job scripts. Only the standard library and the command table are
+# imported up front; numpy, pandas, plotly and Qt are imported by the commands that need them, so
+# planning and simulating start in a fraction of the time the GUI modules take.
+
+csv_file = './average_battery_consumption/average_battery_data.csv'
+
+# Mean consumption per command, precompiled from the CSV with marshal so reading it needs
+# neither numpy, json nor the csv parsing in ConsumptionModel.
+cost_table_file = './average_battery_consumption/average_battery_costs.marshal'
+
+# Returns {command: battery %}, rebuilding the table whenever the CSV is newer. The table is only a
+# cache, so a checkout it can't be written to just rebuilds it every run.
+def load_cost_table(filename=csv_file, table_file=cost_table_file):
+    if os.path.isfile(table_file) and (not os.path.isfile(filename) or os.path.getmtime(table_file) >= os.path.getmtime(filename)):
+        with open(table_file, mode='rb') as file:
+            table = marshal.load(file)
+        if table['commands'] == commands:
+            return dict(zip(commands, table['costs']))
+    from consumption_model import ConsumptionModel
+    costs = ConsumptionModel.load(filename).as_dict()
+    try:
+        with open(table_file, mode='wb') as file:
+            marshal.dump({'commands': list(commands), 'costs': [float(costs[command]) for command in commands]}, file)
+    except OSError:
+        pass
+    return costs
+
+def output(args, result, text):
+    if args.json:
+        import json
+        text = json.dumps(result)
+    print(text)
+
+def plan(args):
+    from tello_battery_tracker_astar import plan_path
+    costs = load_cost_table()
+    grid = None
+    if args.grid is not None or os.path.isfile('./occupancy_grid.txt'):
+        from occupancy_grid import OccupancyGrid
+        grid = OccupancyGrid.load(args.grid or './occupancy_grid.txt')
+    path, expanded = plan_path((0, 0, 0, 0), (args.x, args.y, args.z, args.bearing), costs,
+                               grid=grid, mode=args.mode, weight=args.weight)
+    if path is None:
+        output(args, {'path': None, 'expanded': expanded}, 'No path found.')
+        return 1
+    battery = costs['takeoff'] + sum(costs[move] for move in path) + costs['land']
+    output(args, {'path': path, 'battery': battery, 'expanded': expanded},
+           f"{' '.join(path)}\nBattery needed (with takeoff and land): {battery:.2f}%\nNodes expanded: {expanded}")
+    if args.plot:
+        from tello_battery_tracker_astar import plot_path
+        plot_path(path)
+    return 0
+
+# Flies the script with the same rules as the GUI: moves are refused on the ground and takeoff in
+# the air.
+def simulate(args):
+    from simulated_tello import SimulatedTello
+    from event_log import PrintSink
+    script = args.commands
+    if script == ['-']:
+        script = sys.stdin.read().split()
+    unknown = [command for command in script if command not in command_ids]
+    if unknown:
+        print(f"Unknown command(s): {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    drone = SimulatedTello(load_cost_table(), events=PrintSink() if args.verbose else None)
+    for command in script:
+        getattr(drone, command_methods[command_ids[command]])()
+    output(args, {'battery': drone.battery_percentage, 'position': list(drone.position)},
+           f"Battery: {drone.battery_percentage:.2f}%\nPosition: {drone.position}")
+    return 0
+
+def estimate(args):
+    from flight_estimator import RemainingFlightEstimator, default_mix, expected, guaranteed
+    mix = default_mix
+    if args.mix:
+        mix = {}
+        for item in args.mix.split(','):
+            command, _, weight = item.partition('=')
+            mix[command.strip()] = float(weight) if weight else 1.0
+    estimator = RemainingFlightEstimator.load()
+    if args.distance:
+        pmf = estimator.remaining_distance(args.battery, mix, args.reserve)
+        unit = 'cells'
+    else:
+        pmf = estimator.remaining_commands(args.battery, mix, args.reserve)
+        unit = 'commands'
+    output(args, {'expected': expected(pmf), 'guaranteed': guaranteed(pmf, args.confidence), 'unit': unit},
+           f"Expected: {expected(pmf):.1f} {unit}\n{args.confidence:.0%} confidence: {guaranteed(pmf, args.confidence)} {unit}")
+    return 0
+
+def generate(args):
+    import create_CSV
+    with create_CSV.FlightWriter(args.prefix, args.format, args.shards) as writer:
+        for batch in create_CSV.iter_flight_batches(create_CSV.commands_battery, args.flights, args.seed):
+            writer.write(*batch)
+    output(args, {'flights': args.flights, 'files': writer.filenames},
+           f"{args.flights} flights written to {len(writer.filenames)} file(s).")
+    return 0
+
+def add_plan_parser(subcommands):
+    plan_parser = subcommands.add_parser('plan', help='least-battery path from the origin')
+    for axis in ('x', 'y', 'z'):
+        plan_parser.add_argument(axis, type=int)
+    plan_parser.add_argument('--bearing', type=int, default=0)
+    plan_parser.add_argument('--mode', default='astar', choices=['astar', 'weighted', 'bidirectional', 'jump'])
+    plan_parser.add_argument('--weight', type=float, default=1.5)
+    plan_parser.add_argument('--grid', help='occupancy grid file (default: ./occupancy_grid.txt if present)')
+    plan_parser.add_argument('--plot', action='store_true')
+    plan_parser.set_defaults(run=plan)
+
+def add_simulate_parser(subcommands):
+    simulate_parser = subcommands.add_parser('simulate', help="fly a command script ('-' reads stdin)")
+    simulate_parser.add_argument('commands', nargs='+')
+    simulate_parser.add_argument('--verbose', action='store_true')
+    simulate_parser.set_defaults(run=simulate)
+
+def add_estimate_parser(subcommands):
+    estimate_parser = subcommands.add_parser('estimate', help='remaining commands or distance for a battery level')
+    estimate_parser.add_argument('battery', type=float)
+    estimate_parser.add_argument('--mix', help="command weights, e.g. 'forward=3,cw=1'")
+    estimate_parser.add_argument('--reserve', type=float, default=0.0)
+    estimate_parser.add_argument('--distance', action='store_true')
+    estimate_parser.add_argument('--confidence', type=float, default=0.95)
+    estimate_parser.set_defaults(run=estimate)
+
+def add_generate_parser(subcommands):
+    generate_parser = subcommands.add_parser('generate', help='simulate flights and write logs')
+    generate_parser.add_argument('flights', type=int)
+    generate_parser.add_argument('--format', default='flights', choices=['flights', 'csv', 'npz', 'parquet'])
+    generate_parser.add_argument('--shards', type=int, default=1)
+    generate_parser.add_argument('--seed', type=int)
+    generate_parser.add_argument('--prefix', default='battery_consumption_data')
+    generate_parser.set_defaults(run=generate)
+
+subcommand_parsers = {'plan': add_plan_parser, 'simulate': add_simulate_parser,
+                      'estimate': add_estimate_parser, 'generate': add_generate_parser}
+
+# Setting up argparse costs a noticeable share of startup, so only the subcommand being run is
+# added when it can be told from the arguments; help and errors get all of them.
+def build_parser(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    names = [arg for arg in argv if not arg.startswith('-')][:1]
+    if not names or names[0] not in subcommand_parsers or '-h' in argv or '--help' in argv:
+        names = list(subcommand_parsers)
+    parser = argparse.ArgumentParser(description='Headless Tello battery simulator.')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    for name in names:
+        subcommand_parsers[name](subcommands)
+    return parser
+
+def main(argv=None):
+    args = build_parser(argv).parse_args(argv)
+    return args.run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+# Command table shared by the simulators, the planner and the plots. A command's opcode is its
+# index in this list; it also indexes the per-command arrays of a ConsumptionModel, so logs and
+# scripts can be stored as uint8 code arrays and dispatched by array lookup.
+commands = ['takeoff', 'land', 'up', 'down', 'forward', 'back', 'left', 'right', 'cw', 'ccw', 'flip']
+command_ids = {command: i for i, command in enumerate(commands)}
+
+# Opcode for "no command" in per-tick command vectors.
+no_command = 255
+
+# Change in (x, y, z, bearing) for each opcode. forward/back move along x, left/right along y,
+# up/down along z, and cw/ccw turn the bearing one quarter turn. takeoff, land and flip don't move.
+moving_deltas = {
+    'up': (0, 0, 1, 0),
+    'down': (0, 0, -1, 0),
+    'forward': (1, 0, 0, 0),
+    'back': (-1, 0, 0, 0),
+    'left': (0, -1, 0, 0),
+    'right': (0, 1, 0, 0),
+    'cw': (0, 0, 0, 1),
+    'ccw': (0, 0, 0, -1),
+}
+command_delta_tuples = [moving_deltas.get(command, (0, 0, 0, 0)) for command in commands]
+
+# SimulatedTello method that executes each opcode.
+command_methods = ['takeoff', 'land', 'move_up', 'move_down', 'move_forward', 'move_backward',
+                   'move_left', 'move_right', 'rotate_clockwise', 'rotate_counterclockwise', 'flip']
+
+# The same deltas as an int8 (commands, 4) array. numpy is only imported once an array form is
+# first used, so tools that just need the command table start without it.
+def __getattr__(name):
+    global command_deltas
+    if name == 'command_deltas':
+        import numpy as np
+        command_deltas = np.array(command_delta_tuples, dtype=np.int8)
+        return command_deltas
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def encode_commands(names):
+    import numpy as np
+    return np.array([command_ids[name] for name in names], dtype=np.uint8)
+
+def decode_commands(codes):
+    import numpy as np
+    return [commands[code] for code in np.asarray(codes).tolist()]
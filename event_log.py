@@ -0,0 +1,110 @@
+import time
+from collections import deque, namedtuple
+
+# One simulator action: the command (or status such as 'blocked'), the battery before and
+# after it, the drone's position afterwards and the human-readable message.
+DroneEvent = namedtuple('DroneEvent', ['time', 'command', 'battery_before', 'battery_after', 'position', 'message'])
+
+# json is only imported by the file sink, keeping this module cheap to import for the simulators.
+
+# Sinks receive every event a SimulatedTello emits. They all take the fields as arguments rather
+# than an event object, so a NullSink costs one method call and nothing is built for it.
+
+# Drops every event. The default, for batch runs that only need the final state.
+class NullSink:
+    def emit(self, command, battery_before, battery_after, position, message):
+        pass
+
+    def close(self):
+        pass
+
+# Prints each message to the terminal, as the simulators always did interactively.
+class PrintSink:
+    def emit(self, command, battery_before, battery_after, position, message):
+        print(message)
+
+    def close(self):
+        pass
+
+# Keeps the most recent capacity events in memory.
+class RingBufferSink:
+    def __init__(self, capacity=10000):
+        self.buffer = deque(maxlen=capacity)
+
+    def emit(self, command, battery_before, battery_after, position, message):
+        self.buffer.append(DroneEvent(time.time(), command, battery_before, battery_after, position, message))
+
+    @property
+    def events(self):
+        return list(self.buffer)
+
+    def clear(self):
+        self.buffer.clear()
+
+    def close(self):
+        pass
+
+# Appends events to a JSON-lines file, batch_size at a time, so a run pays for one write per
+# batch instead of one per command. Anything still buffered is written on flush or close.
+class BatchedFileSink:
+    def __init__(self, filename, batch_size=4096):
+        self.filename = filename
+        self.batch_size = batch_size
+        self.pending = []
+
+    def emit(self, command, battery_before, battery_after, position, message):
+        self.pending.append((time.time(), command, battery_before, battery_after, position, message))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        import json
+        lines = [json.dumps(dict(zip(DroneEvent._fields, event))) for event in self.pending]
+        with open(self.filename, mode='a') as file:
+            file.write('\n'.join(lines) + '\n')
+        self.pending = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Passes every event's fields to a function, e.g. to show it in a GUI.
+class CallbackSink:
+    def __init__(self, callback):
+        self.callback = callback
+
+    def emit(self, command, battery_before, battery_after, position, message):
+        self.callback(command, battery_before, battery_after, position, message)
+
+    def close(self):
+        pass
+
+# Sends every event to each of several sinks.
+class TeeSink:
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def emit(self, command, battery_before, battery_after, position, message):
+        for sink in self.sinks:
+            sink.emit(command, battery_before, battery_after, position, message)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+# Reads a file written by BatchedFileSink back as DroneEvents.
+def read_events(filename):
+    import json
+    with open(filename) as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                record['position'] = tuple(record['position'])
+                yield DroneEvent(**record)
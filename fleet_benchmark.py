@@ -0,0 +1,47 @@
+import time
+import numpy as np
+from consumption_model import ConsumptionModel
+from drone_commands import commands, command_ids, command_methods
+from fleet_simulator import FleetSimulator
+from simulated_tello import SimulatedTello
+
+# Measures command throughput of FleetSimulator against one SimulatedTello per drone.
+num_drones = 100000
+num_ticks = 200
+num_object_drones = 1000
+seed = 0
+
+# Random script that takes off, flies and lands every so often, so the landed guards get exercised.
+def random_script(num_ticks, num_drones, seed=seed):
+    rng = np.random.default_rng(seed)
+    script = rng.integers(0, len(commands), size=(num_ticks, num_drones), dtype=np.uint8)
+    script[0] = command_ids['takeoff']
+    return script
+
+def benchmark_fleet(battery_consumption, num_ticks=num_ticks, num_drones=num_drones):
+    script = random_script(num_ticks, num_drones)
+    fleet = FleetSimulator(num_drones, battery_consumption)
+    start = time.perf_counter()
+    fleet.run(script)
+    return script.size / (time.perf_counter() - start)
+
+def benchmark_objects(battery_consumption, num_ticks=num_ticks, num_drones=num_object_drones):
+    script = random_script(num_ticks, num_drones)
+    drones = [SimulatedTello(battery_consumption) for _ in range(num_drones)]
+    calls = [[getattr(drone, method) for method in command_methods] for drone in drones]
+    start = time.perf_counter()
+    for command_codes in script:
+        for drone_calls, code in zip(calls, command_codes.tolist()):
+            drone_calls[code]()
+    return script.size / (time.perf_counter() - start)
+
+def main():
+    battery_consumption = ConsumptionModel.load()
+    fleet_rate = benchmark_fleet(battery_consumption)
+    object_rate = benchmark_objects(battery_consumption)
+    print(f'FleetSimulator: {num_drones} drones x {num_ticks} ticks, {fleet_rate:,.0f} commands/s')
+    print(f'SimulatedTello: {num_object_drones} drones x {num_ticks} ticks, {object_rate:,.0f} commands/s')
+    print(f'Speedup: {fleet_rate / object_rate:.1f}x')
+
+if __name__ == "__main__":
+    main()
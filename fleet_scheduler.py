@@ -0,0 +1,255 @@
+import sys
+import time
+import heapq
+import itertools
+from collections import deque, namedtuple
+import numpy as np
+from consumption_model import ConsumptionModel
+from drone_commands import commands, command_ids, command_delta_tuples
+
+# Discrete-event simulation of a fleet in virtual time. Every drone flies its own script; each
+# command takes command_durations seconds, a drone in the air drains hover_drain % per second
+# while it waits between commands, and with chargers set a landed drone queues for a charger
+# before its next flight. Nothing sleeps, so a day of fleet time runs in seconds.
+
+# Seconds each command takes on a Tello (20 cm moves at its default speed).
+command_durations = {'takeoff': 6.0, 'land': 5.0, 'up': 2.0, 'down': 2.0, 'forward': 2.0, 'back': 2.0,
+                     'left': 2.0, 'right': 2.0, 'cw': 1.5, 'ccw': 1.5, 'flip': 2.0}
+
+# Battery % per second while hovering between commands (about 13 minutes of hover on a full
+# battery); the drain during a command is already in its consumption.
+hover_drain = 0.13
+
+# Seconds a drone hovers after each command, as keyboard_control's one-second pacing did.
+command_gap = 1.0
+
+# Battery % per second on a charger (a full charge in 90 minutes).
+charge_rate = 100 / 5400
+
+takeoff_code = command_ids['takeoff']
+land_code = command_ids['land']
+
+# One entry of the fleet timeline. command is an executed command or one of 'depleted' (ran
+# flat and fell), 'charging' and 'charged'.
+ScheduledEvent = namedtuple('ScheduledEvent', ['time', 'drone', 'command', 'battery_before', 'battery_after', 'position'])
+
+# Events are (time, sequence, kind, drone) tuples on a heap; the sequence number keeps drones
+# scheduled for the same moment in the order they were scheduled. Drone state is kept in lists
+# indexed by drone, which is quicker than numpy for one drone at a time. Commands follow
+# SimulatedTello's rules: takeoff only from the ground, everything else only in the air, and a
+# refused command takes no time.
+class FleetScheduler:
+    def __init__(self, battery_consumption, durations=command_durations, hover_drain=hover_drain,
+                 chargers=0, charge_rate=charge_rate, record=True):
+        self.costs = [battery_consumption[command] for command in commands]
+        self.durations = [durations[command] for command in commands]
+        self.hover_drain = hover_drain
+        self.charge_rate = charge_rate
+        self.free_chargers = chargers
+        self.chargers = chargers
+        self.charger_queue = deque()
+        self.charge_waits = []
+        self.queue = []
+        self.sequence = itertools.count()
+        self.now = 0.0
+        self.events_processed = 0
+        self.timeline = [] if record else None
+        self.handlers = {'command': self.start_command, 'arrive': self.arrive, 'charged': self.charged,
+                         'run_flat': self.run_flat}
+
+        self.scripts = []
+        self.gaps = []
+        self.next_index = []
+        self.battery = []
+        self.landed = []
+        self.position = []
+        self.hover_since = []
+        self.depleted = []
+
+    # Adds a drone that starts its script (command names or opcodes) at start, hovering gap
+    # seconds after each command. Returns its index.
+    def add_drone(self, script, start=0.0, gap=command_gap):
+        drone = len(self.scripts)
+        self.scripts.append([command_ids[command] if isinstance(command, str) else int(command) for command in script])
+        self.gaps.append(gap)
+        self.next_index.append(0)
+        self.battery.append(100.0)
+        self.landed.append(True)
+        self.position.append((0, 0, 0, 0))
+        self.hover_since.append(None)
+        self.depleted.append(None)
+        self.schedule(start, 'command', drone)
+        return drone
+
+    def schedule(self, time, kind, drone):
+        heapq.heappush(self.queue, (time, next(self.sequence), kind, drone))
+
+    def record(self, time, drone, command, battery_before):
+        if self.timeline is not None:
+            self.timeline.append(ScheduledEvent(time, drone, command, battery_before, self.battery[drone], self.position[drone]))
+
+    # Charges the hover drain since the drone last finished a command. A drone whose battery runs
+    # out while hovering falls at the moment it reaches zero.
+    def accrue_hover(self, drone, time):
+        since = self.hover_since[drone]
+        if since is None or time <= since:
+            return
+        battery_before = self.battery[drone]
+        self.battery[drone] -= self.hover_drain * (time - since)
+        self.hover_since[drone] = time
+        if self.battery[drone] <= 0:
+            self.deplete(drone, since + battery_before / self.hover_drain, battery_before)
+
+    # A drone hovering until it runs flat, scheduled by start_command, falls with the battery it
+    # had when it started hovering.
+    def run_flat(self, drone):
+        self.deplete(drone, self.now, self.battery[drone])
+
+    def deplete(self, drone, time, battery_before):
+        self.battery[drone] = 0.0
+        self.landed[drone] = True
+        self.hover_since[drone] = None
+        self.depleted[drone] = time
+        self.record(time, drone, 'depleted', battery_before)
+
+    def start_command(self, drone):
+        script = self.scripts[drone]
+        index = self.next_index[drone]
+        if self.depleted[drone] is not None or index >= len(script):
+            return
+        self.next_index[drone] = index + 1
+        now = self.now
+        self.accrue_hover(drone, now)
+        if self.depleted[drone] is not None:
+            return
+
+        code = script[index]
+        takeoff = code == takeoff_code
+        duration = 0.0
+        if takeoff == self.landed[drone]:
+            battery_before = self.battery[drone]
+            self.battery[drone] -= self.costs[code]
+            duration = self.durations[code]
+            if code == land_code:
+                self.landed[drone] = True
+                self.position[drone] = (0, 0, 0, 0)
+                self.hover_since[drone] = None
+            else:
+                self.landed[drone] = False
+                x, y, z, bearing = self.position[drone]
+                dx, dy, dz, turn = command_delta_tuples[code]
+                self.position[drone] = (x + dx, y + dy, z + dz, (bearing + turn) % 4)
+                self.hover_since[drone] = now + duration
+            self.record(now, drone, commands[code], battery_before)
+            if self.battery[drone] <= 0 and not self.landed[drone]:
+                self.deplete(drone, now + duration, battery_before)
+                return
+            if code == land_code and self.chargers:
+                self.schedule(now + duration, 'arrive', drone)
+                return
+        # A drone left hovering that would run flat before its next command (or with none left)
+        # falls then, instead of being found flat when the command comes round.
+        next_time = now + duration + self.gaps[drone] if index + 1 < len(script) else float('inf')
+        if self.hover_since[drone] is not None:
+            flat_time = self.hover_since[drone] + self.battery[drone] / self.hover_drain
+            if flat_time < next_time:
+                self.schedule(flat_time, 'run_flat', drone)
+                return
+        if index + 1 < len(script):
+            self.schedule(next_time, 'command', drone)
+
+    # A landed drone takes a free charger or joins the queue for one.
+    def arrive(self, drone):
+        if self.free_chargers:
+            self.free_chargers -= 1
+            self.begin_charge(drone, self.now)
+        else:
+            self.charger_queue.append((drone, self.now))
+
+    def begin_charge(self, drone, arrived):
+        self.charge_waits.append(self.now - arrived)
+        self.record(self.now, drone, 'charging', self.battery[drone])
+        self.schedule(self.now + (100.0 - self.battery[drone]) / self.charge_rate, 'charged', drone)
+
+    def charged(self, drone):
+        battery_before = self.battery[drone]
+        self.battery[drone] = 100.0
+        self.record(self.now, drone, 'charged', battery_before)
+        if self.charger_queue:
+            waiting, arrived = self.charger_queue.popleft()
+            self.begin_charge(waiting, arrived)
+        else:
+            self.free_chargers += 1
+        if self.next_index[drone] < len(self.scripts[drone]):
+            self.schedule(self.now + self.gaps[drone], 'command', drone)
+
+    # Processes events in time order until the queue is empty or the next event is after until.
+    # Drones still in the air are charged their hover drain up to the end. Returns the end time.
+    def run(self, until=None):
+        queue, handlers = self.queue, self.handlers
+        while queue and (until is None or queue[0][0] <= until):
+            self.now, _, kind, drone = heapq.heappop(queue)
+            handlers[kind](drone)
+            self.events_processed += 1
+        if until is not None:
+            self.now = max(self.now, until)
+        for drone in range(len(self.scripts)):
+            self.accrue_hover(drone, self.now)
+        return self.now
+
+    # Step function of how many drones are between a start event and one of the end events, as
+    # (times, counts) arrays: e.g. in the air, or on a charger.
+    def profile(self, start='takeoff', ends=('land', 'depleted')):
+        changes = [(event.time, 1 if event.command == start else -1) for event in self.timeline
+                   if event.command == start or event.command in ends]
+        if not changes:
+            return np.zeros(1), np.zeros(1, dtype=np.int64)
+        changes.sort()
+        times = np.array([time for time, _ in changes])
+        counts = np.cumsum([change for _, change in changes])
+        return times, counts
+
+    # simulated_seconds runs to the last event, including a drone falling at the end of the
+    # command it ran flat in, which is after the event that started it.
+    def summary(self):
+        waits = np.array(self.charge_waits) if self.charge_waits else np.zeros(1)
+        end = max([self.now] + [time for time in self.depleted if time is not None])
+        result = {'drones': len(self.scripts), 'events': self.events_processed, 'simulated_seconds': end,
+                  'depleted': sum(time is not None for time in self.depleted),
+                  'mean_battery': float(np.mean(self.battery)) if self.battery else 0.0,
+                  'charges': len(self.charge_waits), 'mean_charge_wait': float(waits.mean()),
+                  'max_charge_wait': float(waits.max())}
+        if self.timeline is not None:
+            result['peak_airborne'] = int(self.profile()[1].max())
+            result['peak_charging'] = int(self.profile('charging', ('charged',))[1].max())
+        return result
+
+# Random missions for num_drones drones: each flies missions flights of commands_per_flight
+# random moves, starting within the first stagger seconds.
+def random_fleet(scheduler, num_drones, missions=3, commands_per_flight=40, stagger=600.0, seed=0):
+    rng = np.random.default_rng(seed)
+    moves = [command for command in commands if command not in ('takeoff', 'land')]
+    for _ in range(num_drones):
+        script = []
+        for _ in range(missions):
+            script += ['takeoff'] + [moves[code] for code in rng.integers(len(moves), size=commands_per_flight)] + ['land']
+        scheduler.add_drone(script, start=float(rng.uniform(0, stagger)))
+
+def main():
+    num_drones = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    chargers = int(sys.argv[2]) if len(sys.argv) > 2 else max(1, num_drones // 4)
+    scheduler = FleetScheduler(ConsumptionModel.load(), chargers=chargers)
+    random_fleet(scheduler, num_drones)
+    start = time.perf_counter()
+    scheduler.run()
+    elapsed = time.perf_counter() - start
+    summary = scheduler.summary()
+    print(f"{summary['drones']} drones, {chargers} chargers: {summary['events']} events over "
+          f"{summary['simulated_seconds'] / 3600:.2f} simulated hours in {elapsed:.2f} s "
+          f"({summary['simulated_seconds'] / elapsed:.0f}x real time)")
+    print(f"Peak airborne {summary['peak_airborne']}, peak charging {summary['peak_charging']}, "
+          f"{summary['depleted']} depleted, charger wait mean {summary['mean_charge_wait'] / 60:.1f} min "
+          f"max {summary['max_charge_wait'] / 60:.1f} min")
+
+if __name__ == "__main__":
+    main()
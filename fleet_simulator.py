@@ -0,0 +1,48 @@
+import numpy as np
+from consumption_model import ConsumptionModel
+from drone_commands import commands, command_ids, command_deltas, no_command
+
+# Simulates a fleet of drones in lockstep. State is kept as one array per field rather than one
+# object per drone, and each tick applies a vector of command ids (one per drone, no_command to
+# skip) with the same rules as SimulatedTello: takeoff only from the ground, every other command
+# only in the air, and landing returns the drone to the origin.
+class FleetSimulator:
+    def __init__(self, num_drones, battery_consumption):
+        self.num_drones = num_drones
+        self.battery_percentage = np.full(num_drones, 100.0)
+        self.landed = np.ones(num_drones, dtype=bool)
+        self.position = np.zeros((num_drones, 4), dtype=np.int32)
+
+        # Lookup tables indexed by opcode; the unused codes up to no_command cost nothing.
+        self.costs = np.zeros(no_command + 1)
+        self.deltas = np.zeros((no_command + 1, 4), dtype=np.int32)
+        self.needs_air = np.zeros(no_command + 1, dtype=bool)
+        self.costs[:len(commands)] = [battery_consumption[command] for command in commands]
+        self.deltas[:len(commands)] = command_deltas
+        self.needs_air[:len(commands)] = True
+        self.needs_air[command_ids['takeoff']] = False
+
+    # Applies one command per drone and returns a mask of the drones whose command was executed.
+    def step(self, command_codes):
+        command_codes = np.broadcast_to(np.asarray(command_codes, dtype=np.uint8), (self.num_drones,))
+        takeoff = command_codes == command_ids['takeoff']
+        executed = np.where(self.needs_air[command_codes], ~self.landed, takeoff & self.landed)
+
+        self.battery_percentage -= np.where(executed, self.costs[command_codes], 0.0)
+        self.position += self.deltas[command_codes] * executed[:, None]
+
+        landing = executed & (command_codes == command_ids['land'])
+        self.position[landing] = 0
+        self.landed = (self.landed & ~(executed & takeoff)) | landing
+        return executed
+
+    # Runs a script of shape (ticks, num_drones), or (ticks,) to send every drone the same command.
+    # Returns how many commands were executed.
+    def run(self, script):
+        executed = 0
+        for command_codes in np.asarray(script, dtype=np.uint8):
+            executed += int(np.count_nonzero(self.step(command_codes)))
+        return executed
+
+def load_fleet(num_drones, csv_file='./average_battery_consumption/average_battery_data.csv'):
+    return FleetSimulator(num_drones, ConsumptionModel.load(csv_file))
@@ -0,0 +1,159 @@
+import os
+import numpy as np
+from consumption_model import untested_consumption
+from drone_commands import commands, command_ids, command_delta_tuples
+
+distribution_file = './average_battery_consumption/consumption_distributions.npz'
+log_folder = './battery_consumption'
+
+# Width (%) of the bins each command's consumption distribution is kept in.
+bin_width = 0.05
+
+# Commands a drone picks from in flight, weighted equally, as in create_CSV.py. That never flies
+# 'up' (its range only sets the takeoff drain), so 'up' is left out too.
+default_mix = {command: 1.0 for command in commands if command not in ('takeoff', 'land', 'up')}
+
+# Commands that move the drone one cell; everything else in a mix only costs battery.
+moving_commands = {command for command in commands if any(command_delta_tuples[command_ids[command]][:3])}
+
+# Battery consumption of every command as a probability mass function over bins of bin_width,
+# used to estimate how much more a drone can fly without simulating it. Sums of independent
+# commands are convolutions of their distributions, so the estimates below take one FFT of the
+# command mix and raise it to successive powers instead of running Monte Carlo loops.
+class RemainingFlightEstimator:
+    def __init__(self, pmfs, bin_width=bin_width):
+        self.pmfs = np.asarray(pmfs, dtype=np.float64)
+        self.bin_width = bin_width
+
+    # Histograms each command's recorded consumption from a frame of logs (see flight_logs.read_csvs).
+    # 'up' was never flown in the tests, so it falls back to its hard coded value.
+    @classmethod
+    def from_frame(cls, df, bin_width=bin_width):
+        codes = np.asarray(df['Command'].map(command_ids), dtype=np.int64)
+        bins = np.maximum(np.rint(df['Battery Consumption (%)'].to_numpy(np.float64) / bin_width), 0).astype(np.int64)
+        num_bins = int(bins.max()) + 1 if len(bins) else 1
+        for consumption in untested_consumption.values():
+            num_bins = max(num_bins, round(consumption / bin_width) + 1)
+        counts = np.bincount(codes * num_bins + bins, minlength=len(commands) * num_bins).reshape(len(commands), num_bins)
+        for command, consumption in untested_consumption.items():
+            if counts[command_ids[command]].sum() == 0:
+                counts[command_ids[command], round(consumption / bin_width)] = 1
+        totals = counts.sum(axis=1, keepdims=True)
+        return cls(np.divide(counts, totals, out=np.zeros(counts.shape), where=totals > 0), bin_width)
+
+    def save(self, filename=distribution_file):
+        np.savez(filename, pmfs=self.pmfs, bin_width=self.bin_width, commands=np.array(commands))
+
+    @classmethod
+    def from_cache(cls, filename=distribution_file):
+        with np.load(filename) as data:
+            if list(data['commands']) != commands:
+                raise ValueError(f"{filename} was built for a different command table")
+            return cls(data['pmfs'], float(data['bin_width']))
+
+    # Loads the cached distributions, building them from the logs in folder the first time.
+    @classmethod
+    def load(cls, filename=distribution_file, folder=log_folder):
+        if os.path.isfile(filename):
+            return cls.from_cache(filename)
+        # plot_data pulls in pandas and plotly, which only a rebuild needs.
+        from flight_logs import read_csvs
+        estimator = cls.from_frame(read_csvs(folder))
+        estimator.save(filename)
+        return estimator
+
+    # Consumption distribution of one command drawn from mix, a dict of command weights.
+    def mix_pmf(self, mix):
+        weights = np.zeros(len(commands))
+        for command, weight in mix.items():
+            weights[command_ids[command]] = weight
+        if weights.sum() <= 0:
+            raise ValueError("Command mix has no positive weights")
+        unknown = (weights > 0) & (self.pmfs.sum(axis=1) == 0)
+        if unknown.any():
+            raise ValueError(f"No consumption data for: {', '.join(np.array(commands)[unknown])}")
+        return weights @ self.pmfs / weights.sum()
+
+    # Probability that each of n = 0, 1, ... steps, whose summed costs have the spectrum
+    # spectrum ** n over size bins, fit in budget_bins. Stays in the frequency domain throughout:
+    # sum(pmf[:budget + 1]) is the inner product of pmf with an indicator, which is the same
+    # inner product over the spectra, so no inverse FFT is needed for any n.
+    def fit_probabilities(self, spectrum, size, budget_bins, max_steps):
+        indicator = np.zeros(size)
+        indicator[:budget_bins + 1] = 1.0
+        weights = 2.0 * np.conj(np.fft.rfft(indicator)) / size
+        weights[0] /= 2.0
+        if size % 2 == 0:
+            weights[-1] /= 2.0
+        fits = np.empty(max_steps + 1)
+        fits[0] = 1.0
+        power = spectrum.copy()
+        for steps in range(1, max_steps + 1):
+            fits[steps] = np.real(np.dot(power, weights))
+            power *= spectrum
+        return np.minimum.accumulate(np.clip(fits, 0.0, 1.0))
+
+    # Probability distribution of the number of further commands (drawn from mix) a drone with
+    # battery % left can complete while keeping reserve % back, e.g. for landing: entry n is
+    # P(exactly n commands). Zero-cost bins count as one bin so the count stays finite.
+    def remaining_commands(self, battery, mix=default_mix, reserve=0.0):
+        step = self.mix_pmf(mix)
+        budget_bins = int(np.floor(max(battery - reserve, 0.0) / self.bin_width + 1e-9))
+        nonzero = np.flatnonzero(step)
+        cheapest, dearest = max(int(nonzero[0]), 1), int(nonzero[-1])
+        max_steps = budget_bins // cheapest + 1
+        # Every sum of up to max_steps commands fits, so no mass wraps around.
+        size = 1 << int(np.ceil(np.log2(max_steps * dearest + budget_bins + 2)))
+        fits = self.fit_probabilities(np.fft.rfft(step, size), size, budget_bins, max_steps)
+        return to_pmf(fits)
+
+    # Probability distribution of the number of cells a drone can still fly with commands from
+    # mix: each cell is one moving command, preceded by however many turns or flips the mix
+    # interleaves (geometrically many), whose spectrum sums in closed form.
+    def remaining_distance(self, battery, mix=default_mix, reserve=0.0):
+        moving = {command: weight for command, weight in mix.items() if command in moving_commands and weight > 0}
+        other = {command: weight for command, weight in mix.items() if command not in moving_commands and weight > 0}
+        if not moving:
+            raise ValueError("Command mix has no moving commands")
+        share = sum(moving.values()) / (sum(moving.values()) + sum(other.values()))
+        move_pmf = self.mix_pmf(moving)
+        budget_bins = int(np.floor(max(battery - reserve, 0.0) / self.bin_width + 1e-9))
+        cheapest = max(int(np.flatnonzero(move_pmf)[0]), 1)
+        max_steps = budget_bins // cheapest + 1
+        bins = np.arange(self.pmfs.shape[1])
+        cell_cost = move_pmf @ bins
+        if other:
+            cell_cost += (1.0 - share) / share * (self.mix_pmf(other) @ bins)
+        # The interleaved commands are unbounded, so size leaves room for twice the expected
+        # cost of max_steps cells; the mass that could still wrap around is negligible.
+        size = 1 << int(np.ceil(np.log2(2 * max_steps * max(cell_cost, 1.0) + budget_bins + 2)))
+        spectrum = np.fft.rfft(move_pmf, size)
+        if other:
+            spectrum = spectrum * share / (1.0 - (1.0 - share) * np.fft.rfft(self.mix_pmf(other), size))
+        fits = self.fit_probabilities(spectrum, size, budget_bins, max_steps)
+        return to_pmf(fits)
+
+# Distribution of a count from P(count >= n) for n = 0, 1, ...
+def to_pmf(at_least):
+    return np.append(at_least[:-1] - at_least[1:], at_least[-1])
+
+# Largest count reached with at least the given probability.
+def guaranteed(pmf, confidence=0.95):
+    at_least = pmf[::-1].cumsum()[::-1]
+    return int(np.flatnonzero(at_least >= confidence - 1e-12)[-1])
+
+def expected(pmf):
+    return float(np.arange(len(pmf)) @ pmf)
+
+def main():
+    from flight_logs import read_csvs
+    estimator = RemainingFlightEstimator.from_frame(read_csvs(log_folder))
+    estimator.save()
+    for battery in (100, 50, 20):
+        pmf = estimator.remaining_commands(battery)
+        print(f"{battery}% battery: {expected(pmf):.1f} commands expected, "
+              f"{guaranteed(pmf)} with 95% confidence")
+    print(f"Distributions saved to {distribution_file}")
+
+if __name__ == "__main__":
+    main()
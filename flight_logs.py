@@ -0,0 +1,125 @@
+import io
+import os
+import re
+import glob
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from drone_commands import commands
+
+# Finding and reading flight logs, kept apart from the plots so headless tools can read logs
+# without importing plotly.
+
+# Command is read as a categorical over the shared command table, so per-file frames concatenate
+# without falling back to strings and the category codes are the command opcodes. Consumption
+# is read as float64, so averages come out digit for digit as they did from plain read_csv. The
+# same map serves every CSV; read_csv ignores flight_id for per-flight CSVs, which lack it.
+command_dtype = pd.CategoricalDtype(commands)
+log_dtypes = {'flight_id': np.uint32, 'Command': command_dtype, 'Battery Consumption (%)': np.float64}
+log_patterns = ['*.csv', '*.npz', '*.parquet']
+
+# Reads one log into a frame with flight, Command and Battery Consumption (%) columns.
+# Per-flight CSVs take their flight number from the file name; sharded logs from create_CSV.py
+# carry a flight_id column.
+def read_log(file_path, flight):
+    if file_path.endswith('.npz'):
+        with np.load(file_path) as data:
+            names = pd.Categorical.from_codes(data['command'], categories=data['command_names'])
+            df = pd.DataFrame({'flight_id': data['flight_id'],
+                               'Command': names.astype(command_dtype),
+                               'Battery Consumption (%)': data['consumption'].astype(np.float64)})
+    elif file_path.endswith('.parquet'):
+        df = pd.read_parquet(file_path).astype(log_dtypes)
+    else:
+        df = pd.read_csv(file_path, dtype=log_dtypes)
+    return with_flights(df, flight)
+
+def with_flights(df, flight):
+    if 'flight_id' in df:
+        flights = df.pop('flight_id')
+    else:
+        flights = np.full(len(df), flight, dtype=np.uint32)
+    df.insert(0, 'flight', flights)
+    return df
+
+# Reads a log for read_logs, opening it once. Sharded logs come back parsed; a per-flight CSV
+# comes back unparsed as (header, body, rows, flight), so consecutive ones can be parsed together.
+def load_log(file_path, flight):
+    if not file_path.endswith('.csv'):
+        return read_log(file_path, flight)
+    with open(file_path, mode='rb') as file:
+        text = file.read()
+    header, _, body = text.partition(b'\n')
+    if b'flight_id' in header:
+        return with_flights(pd.read_csv(io.BytesIO(text), dtype=log_dtypes), flight)
+    if body and not body.endswith(b'\n'):
+        body += b'\n'
+    return header.strip(), body, body.count(b'\n'), flight
+
+# A per-flight CSV holds a few dozen rows, so parsing them one by one is almost all per-call
+# overhead. Their bodies are joined and parsed in one read_csv call, and each row's flight is
+# repeated from the number of lines each file gave. Blank lines, which read_csv skips, throw the
+# counts off; those logs are parsed one by one instead.
+def parse_flight_csvs(header, csvs):
+    df = pd.read_csv(io.BytesIO(b'\n'.join([header, b''.join(body for _, body, _, _ in csvs)])), dtype=log_dtypes)
+    rows = [rows for _, _, rows, _ in csvs]
+    if len(df) != sum(rows):
+        return pd.concat([with_flights(pd.read_csv(io.BytesIO(header + b'\n' + body), dtype=log_dtypes), flight)
+                          for _, body, _, flight in csvs], ignore_index=True)
+    df.insert(0, 'flight', np.repeat(np.array([flight for _, _, _, flight in csvs], dtype=np.uint32), rows))
+    return df
+
+def flight_number(file_path):
+    match = re.search(r'battery_consumption_data_(\d+)\.csv$', file_path)
+    return int(match.group(1)) if match else None
+
+# Lists every log under folder_path in flight order, with the flight number used for each
+# per-flight CSV. Logs not named after a flight are numbered after the last one that is.
+def find_logs(folder_path):
+    file_paths = [path for pattern in log_patterns for path in glob.glob(os.path.join(folder_path, pattern))]
+    file_paths.sort(key=lambda path: (flight_number(path) is None, flight_number(path) or 0, path))
+    numbers = [flight_number(path) for path in file_paths]
+    last = max([number for number in numbers if number is not None], default=0)
+    unnumbered = itertools.count(last + 1)
+    flights = [next(unnumbered) if number is None else number for number in numbers]
+    return file_paths, flights
+
+# Reads the given logs in a thread pool and returns them as one frame. Flight ids are only unique
+# within a file (a sharded log's flight_id column can reuse ids of another run's shards or of
+# per-flight CSVs), so logs whose ids clash with ones read before have their flights moved past
+# the largest id so far. The ids seen are kept in a set, so each one is only looked up once.
+def read_logs(file_paths, flights, max_workers=None):
+    if not file_paths:
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in
+                             [('flight', np.uint32), ('Command', command_dtype), ('Battery Consumption (%)', np.float64)]})
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        loaded = list(executor.map(load_log, file_paths, flights))
+    dataframes = []
+    for header, group in itertools.groupby(loaded, key=lambda item: item[0] if isinstance(item, tuple) else None):
+        if header is None:
+            dataframes.extend(group)
+        else:
+            dataframes.append(parse_flight_csvs(header, list(group)))
+
+    df = pd.concat(dataframes, ignore_index=True)
+    flight_ids = df['flight'].to_numpy().copy()
+    taken, largest, start = set(), 0, 0
+    for end in np.cumsum([len(frame) for frame in dataframes]).tolist():
+        ids = np.unique(flight_ids[start:end])
+        if len(ids):
+            if not taken.isdisjoint(ids.tolist()):
+                offset = np.uint32(largest - int(ids[0]) + 1)
+                flight_ids[start:end] += offset
+                ids += offset
+            taken.update(ids.tolist())
+            largest = max(largest, int(ids[-1]))
+        start = end
+    df['flight'] = flight_ids
+    return df
+
+# Reads every log under folder_path and returns them as one frame.
+def read_csvs(folder_path, max_workers=None):
+    file_paths, flights = find_logs(folder_path)
+    return read_logs(file_paths, flights, max_workers)
@@ -0,0 +1,204 @@
+import csv
+import sys
+import time
+import numpy as np
+from consumption_model import ConsumptionModel
+from drone_commands import commands, command_ids, command_methods, no_command
+from fleet_simulator import FleetSimulator
+from flight_logs import find_logs
+from simulated_tello import SimulatedTello
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+log_folder = './battery_consumption'
+
+# Recorded flights were flown one command every command_interval seconds; a replay speed of 2
+# runs twice as fast, and a speed of None as fast as possible.
+command_interval = 1.0
+
+# Flights replayed together through one FleetSimulator in batch mode.
+replay_batch_size = 1024
+
+# Yields (flight, opcode, consumption) for each row of one log without reading it all first.
+# Per-flight CSVs take their flight number from the caller; sharded logs carry a flight_id column.
+def iter_log(file_path, flight=None):
+    if file_path.endswith('.npz'):
+        with np.load(file_path) as data:
+            codes = encode_names(data['command_names'])[data['command']]
+            for row in zip(data['flight_id'].tolist(), codes.tolist(), data['consumption'].tolist()):
+                yield row
+    elif file_path.endswith('.parquet'):
+        if pq is None:
+            raise ImportError("Reading parquet requires pyarrow.")
+        for batch in pq.ParquetFile(file_path).iter_batches():
+            columns = batch.to_pydict()
+            for flight_id, command, consumption in zip(columns['flight_id'], columns['Command'], columns['Battery Consumption (%)']):
+                yield flight_id, command_ids[command], consumption
+    else:
+        with open(file_path, newline='') as file:
+            reader = csv.reader(file)
+            header = next(reader, None)
+            if header is None:
+                return
+            has_flight_id = header[0] == 'flight_id'
+            for row in reader:
+                if has_flight_id:
+                    yield int(row[0]), command_ids[row[1]], float(row[2])
+                else:
+                    yield flight, command_ids[row[0]], float(row[1])
+
+# Maps a log's own command names to opcodes of the shared table.
+def encode_names(names):
+    return np.array([command_ids[str(name)] for name in names], dtype=np.uint8)
+
+# Yields (flight, opcodes, recorded consumptions) one flight at a time across every log under
+# folder_path. Only the flight being assembled is held in memory.
+def iter_flights(folder_path=log_folder):
+    file_paths, flights = find_logs(folder_path)
+    for file_path, flight in zip(file_paths, flights):
+        current, codes, consumptions = None, [], []
+        for row_flight, code, consumption in iter_log(file_path, flight):
+            if row_flight != current and codes:
+                yield current, np.array(codes, dtype=np.uint8), np.array(consumptions)
+                codes, consumptions = [], []
+            current = row_flight
+            codes.append(code)
+            consumptions.append(consumption)
+        if codes:
+            yield current, np.array(codes, dtype=np.uint8), np.array(consumptions)
+
+# Sleeps until tick number ticks of a replay started at start is due, if the replay is paced.
+def pace(start, ticks, speed):
+    if speed:
+        delay = start + ticks * command_interval / speed - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+# Running per-command statistics of recorded minus simulated consumption, plus the same for whole
+# flights. Accumulators from separate replays can be merged.
+class ResidualStats:
+    def __init__(self):
+        self.counts = np.zeros(len(commands), dtype=np.int64)
+        self.sums = np.zeros(len(commands))
+        self.squares = np.zeros(len(commands))
+        self.abs_sums = np.zeros(len(commands))
+        self.flight_residuals = []
+
+    def add(self, codes, recorded, simulated, flight_offsets=None):
+        residuals = recorded - simulated
+        self.counts += np.bincount(codes, minlength=len(commands))[:len(commands)]
+        self.sums += np.bincount(codes, weights=residuals, minlength=len(commands))[:len(commands)]
+        self.squares += np.bincount(codes, weights=residuals * residuals, minlength=len(commands))[:len(commands)]
+        self.abs_sums += np.bincount(codes, weights=np.abs(residuals), minlength=len(commands))[:len(commands)]
+        if flight_offsets is None:
+            flight_offsets = [0, len(codes)]
+        self.flight_residuals.extend(np.add.reduceat(residuals, flight_offsets[:-1]).tolist() if len(codes) else [])
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.sums += other.sums
+        self.squares += other.squares
+        self.abs_sums += other.abs_sums
+        self.flight_residuals.extend(other.flight_residuals)
+        return self
+
+    # One row per command flown: count, mean (bias), standard deviation, mean absolute error and
+    # root mean square error of the residuals.
+    def summary(self):
+        rows = []
+        for code in np.flatnonzero(self.counts):
+            count = self.counts[code]
+            mean = self.sums[code] / count
+            rows.append({'command': commands[code], 'count': int(count), 'mean': float(mean),
+                         'std': float(np.sqrt(max(self.squares[code] / count - mean * mean, 0.0))),
+                         'mae': float(self.abs_sums[code] / count), 'rmse': float(np.sqrt(self.squares[code] / count))})
+        return rows
+
+    def flight_summary(self):
+        residuals = np.array(self.flight_residuals)
+        if not len(residuals):
+            return {'flights': 0}
+        return {'flights': len(residuals), 'mean': float(residuals.mean()), 'std': float(residuals.std()),
+                'p5': float(np.percentile(residuals, 5)), 'p95': float(np.percentile(residuals, 95))}
+
+# Replays flights one at a time through SimulatedTello and returns the residual statistics.
+def replay_objects(flights, battery_consumption, speed=None):
+    stats = ResidualStats()
+    start, ticks = time.perf_counter(), 0
+    for _, codes, recorded in flights:
+        drone = SimulatedTello(battery_consumption)
+        calls = [getattr(drone, method) for method in command_methods]
+        simulated = np.empty(len(codes))
+        for i, code in enumerate(codes.tolist()):
+            pace(start, ticks, speed)
+            battery_before = drone.battery_percentage
+            calls[code]()
+            simulated[i] = battery_before - drone.battery_percentage
+            ticks += 1
+        stats.add(codes, recorded, simulated)
+    return stats
+
+# Replays flights batch_size at a time through one FleetSimulator, one command of every flight
+# per tick, and returns the residual statistics. Shorter flights are padded with no_command.
+def replay_fleet(flights, battery_consumption, speed=None, batch_size=replay_batch_size):
+    stats = ResidualStats()
+    start, ticks = time.perf_counter(), 0
+    batch = []
+    for flight in flights:
+        batch.append(flight)
+        if len(batch) == batch_size:
+            ticks = replay_batch(batch, battery_consumption, stats, start, ticks, speed)
+            batch = []
+    if batch:
+        replay_batch(batch, battery_consumption, stats, start, ticks, speed)
+    return stats
+
+def replay_batch(batch, battery_consumption, stats, start, ticks, speed):
+    lengths = np.array([len(codes) for _, codes, _ in batch])
+    script = np.full((lengths.max(), len(batch)), no_command, dtype=np.uint8)
+    for column, (_, codes, _) in enumerate(batch):
+        script[:len(codes), column] = codes
+    fleet = FleetSimulator(len(batch), battery_consumption)
+    simulated = np.zeros(script.shape)
+    for tick, command_codes in enumerate(script):
+        pace(start, ticks, speed)
+        battery_before = fleet.battery_percentage.copy()
+        fleet.step(command_codes)
+        simulated[tick] = battery_before - fleet.battery_percentage
+        ticks += 1
+    # Back to flight-major order so each flight's rows are contiguous.
+    valid = np.arange(script.shape[0])[:, None] < lengths
+    codes = script.T[valid.T]
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    stats.add(codes, np.concatenate([recorded for _, _, recorded in batch]), simulated.T[valid.T], offsets)
+    return ticks
+
+# Replays every log under folder_path against the model and returns its ResidualStats.
+# batch_size=1 drives SimulatedTello objects; anything larger drives a FleetSimulator.
+def replay(folder_path=log_folder, battery_consumption=None, speed=None, batch_size=replay_batch_size):
+    if battery_consumption is None:
+        battery_consumption = ConsumptionModel.load()
+    flights = iter_flights(folder_path)
+    if batch_size == 1:
+        return replay_objects(flights, battery_consumption, speed)
+    return replay_fleet(flights, battery_consumption, speed, batch_size)
+
+def main():
+    folder_path = sys.argv[1] if len(sys.argv) > 1 else log_folder
+    start = time.perf_counter()
+    stats = replay(folder_path)
+    elapsed = time.perf_counter() - start
+    print(f"{'Command':<8} {'Count':>9} {'Bias':>8} {'Std':>8} {'MAE':>8} {'RMSE':>8}")
+    for row in stats.summary():
+        print(f"{row['command']:<8} {row['count']:>9} {row['mean']:>8.4f} {row['std']:>8.4f} {row['mae']:>8.4f} {row['rmse']:>8.4f}")
+    flights = stats.flight_summary()
+    if flights['flights']:
+        print(f"Per flight: {flights['flights']} flights, total residual {flights['mean']:.3f} "
+              f"+/- {flights['std']:.3f}% (p5 {flights['p5']:.3f}, p95 {flights['p95']:.3f})")
+    print(f"Replayed in {elapsed:.2f} s")
+
+if __name__ == "__main__":
+    main()
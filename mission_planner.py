@@ -0,0 +1,218 @@
+import os
+import sys
+import hashlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from consumption_model import ConsumptionModel
+from cost_to_go import cost_to_go_field, field_margin
+from occupancy_grid import load_default_grid
+
+cache_folder = './average_battery_consumption/mission_costs'
+
+# Box, blocked mask and consumption shared by every worker of a cost matrix pool.
+worker_state = {}
+
+def init_worker(battery_consumption, origin, shape, blocked):
+    worker_state.update(battery_consumption=battery_consumption, origin=origin, shape=shape, blocked=blocked)
+
+# Battery (%) needed to fly from every point to points[destination]: one cost-to-go sweep gives
+# the whole column of the matrix.
+def cost_column(points, destination):
+    field = cost_to_go_field(points[destination], worker_state['battery_consumption'], worker_state['origin'],
+                             worker_state['shape'], worker_state['blocked'])
+    return np.array([field.cost(point) for point in points], dtype=np.float64)
+
+# Box the sweeps run over: the whole grid when there is one (anything outside it is blocked),
+# otherwise the points' bounding box plus a margin for detours.
+def matrix_box(points, grid=None):
+    if grid is not None:
+        return grid.origin, grid.shape, grid.to_dense()
+    points = np.asarray(points)
+    low = points.min(axis=0) - field_margin
+    high = points.max(axis=0) + field_margin
+    return tuple(int(value) for value in low), tuple(int(value) for value in high - low + 1), None
+
+# Without obstacles the cheapest route flies straight along each axis, so a trip costs the same
+# per-axis step sum as position_cost_estimate and the matrix comes straight from the offsets
+# between the points, in O(n^2) memory however far apart they are.
+def open_cost_matrix(points, battery_consumption):
+    points = np.asarray(points, dtype=np.int64)
+    offsets = points[None, :, :] - points[:, None, :]
+    positive = np.array([battery_consumption[move] for move in ('forward', 'right', 'up')], dtype=np.float64)
+    negative = np.array([battery_consumption[move] for move in ('back', 'left', 'down')], dtype=np.float64)
+    return (np.maximum(offsets, 0) * positive + np.maximum(-offsets, 0) * negative).sum(axis=2)
+
+# Least-battery cost between every ordered pair of points: matrix[i, j] is the battery (%) needed
+# to fly from points[i] to points[j], inf when no route avoids the grid's blocked cells. With a
+# grid, each column takes its own sweep and columns are swept in parallel across processes;
+# max_workers=1 runs them in this process.
+def cost_matrix(points, battery_consumption, grid=None, max_workers=None):
+    points = [tuple(int(value) for value in point[:3]) for point in points]
+    if grid is None:
+        return open_cost_matrix(points, battery_consumption)
+    origin, shape, blocked = matrix_box(points, grid)
+    state = (battery_consumption, origin, shape, blocked)
+    if max_workers == 1 or len(points) < 3:
+        init_worker(*state)
+        columns = [cost_column(points, destination) for destination in range(len(points))]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker, initargs=state) as executor:
+            columns = list(executor.map(cost_column, [points] * len(points), range(len(points))))
+    return np.stack(columns, axis=1)
+
+# Key for a cost matrix: the points, the consumption costs and the grid all change it.
+def matrix_signature(points, battery_consumption, grid=None):
+    digest = hashlib.sha1()
+    digest.update(np.asarray([point[:3] for point in points], dtype=np.int64).tobytes())
+    digest.update(np.asarray([battery_consumption[move] for move in battery_consumption.keys()], dtype=np.float64).tobytes())
+    if grid is not None:
+        digest.update(np.asarray(grid.origin + grid.shape, dtype=np.int64).tobytes())
+        digest.update(grid.bits.tobytes())
+    return digest.hexdigest()
+
+# cost_matrix, saved under folder and reused while the points, consumption and grid are unchanged.
+def cached_cost_matrix(points, battery_consumption, grid=None, folder=cache_folder, max_workers=None):
+    filename = os.path.join(folder, matrix_signature(points, battery_consumption, grid) + '.npy')
+    if os.path.isfile(filename):
+        return np.load(filename)
+    matrix = cost_matrix(points, battery_consumption, grid, max_workers)
+    os.makedirs(folder, exist_ok=True)
+    np.save(filename, matrix)
+    return matrix
+
+def tour_cost(tour, matrix):
+    return float(matrix[tour[:-1], tour[1:]].sum())
+
+# Closed tour from point 0 (home) that always flies to the cheapest unvisited point next.
+def nearest_neighbour_tour(matrix):
+    unvisited = np.ones(len(matrix), dtype=bool)
+    unvisited[0] = False
+    tour = [0]
+    for _ in range(len(matrix) - 1):
+        costs = np.where(unvisited, matrix[tour[-1]], np.inf)
+        following = int(np.argmin(costs))
+        unvisited[following] = False
+        tour.append(following)
+    tour.append(0)
+    return np.array(tour)
+
+# Improves a closed tour by reversing segments while any reversal makes it cheaper. Costs aren't
+# symmetric (climbing and descending differ), so a reversed segment is charged its reverse legs,
+# taken from prefix sums of the legs in both directions; every segment end j for a given start is
+# priced at once.
+def two_opt(tour, matrix, max_passes=100):
+    tour = np.array(tour)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, len(tour) - 2):
+            forward = np.concatenate(([0.0], np.cumsum(matrix[tour[:-1], tour[1:]])))
+            backward = np.concatenate(([0.0], np.cumsum(matrix[tour[1:], tour[:-1]])))
+            ends = np.arange(i + 1, len(tour) - 1)
+            before, first, last, after = tour[i - 1], tour[i], tour[ends], tour[ends + 1]
+            with np.errstate(invalid='ignore'):
+                change = (matrix[before, last] + matrix[first, after] + backward[ends] - backward[i]
+                          - matrix[before, first] - matrix[last, after] - forward[ends] + forward[i])
+            change = np.where(np.isnan(change), np.inf, change)
+            best = int(np.argmin(change))
+            if change[best] < -1e-9:
+                j = ends[best]
+                tour[i:j + 1] = tour[i:j + 1][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return tour
+
+# Waypoint visiting order split into flights, each starting with a takeoff from home and ending
+# with a landing there. A battery swap is needed between consecutive flights.
+class MissionPlan:
+    def __init__(self, waypoints, home, order, flights, flight_costs):
+        self.waypoints = waypoints
+        self.home = home
+        self.order = order
+        self.flights = flights
+        self.flight_costs = flight_costs
+
+    @property
+    def swaps(self):
+        return len(self.flights) - 1
+
+    @property
+    def total_cost(self):
+        return sum(self.flight_costs)
+
+    # Waypoint index after which the drone has to fly home for a fresh battery, one per swap.
+    @property
+    def swap_points(self):
+        return [flight[-1] for flight in self.flights[:-1]]
+
+    def describe(self):
+        lines = [f"Mission: {len(self.waypoints)} waypoints, {len(self.flights)} flights, "
+                 f"{self.swaps} battery swaps, {self.total_cost:.2f}% battery in total"]
+        for number, (flight, cost) in enumerate(zip(self.flights, self.flight_costs), start=1):
+            stops = ' -> '.join(str(self.waypoints[index]) for index in flight)
+            lines.append(f"Flight {number} ({cost:.2f}%): home -> {stops} -> home")
+            if number < len(self.flights):
+                lines.append(f"Swap battery after waypoint {self.waypoints[flight[-1]]}")
+        return '\n'.join(lines)
+
+# Splits a tour (indices into matrix, home at 0) into flights. Before flying to each waypoint the
+# drone checks it could still get there, back home and land on what's left; if not it goes home
+# first and swaps the battery. battery is a full charge and reserve the share never planned for.
+def split_flights(tour, matrix, battery_consumption, battery=100, reserve=0):
+    takeoff = battery_consumption['takeoff']
+    land = battery_consumption['land']
+    budget = battery - reserve
+    flights, flight_costs = [], []
+    flight, used, current = [], takeoff, 0
+    for point in tour[1:-1]:
+        point = int(point)
+        if takeoff + matrix[0, point] + matrix[point, 0] + land > budget:
+            raise ValueError(f"Waypoint {point - 1} can't be reached and flown back from on one battery")
+        if used + matrix[current, point] + matrix[point, 0] + land > budget:
+            flights.append(flight)
+            flight_costs.append(used + matrix[current, 0] + land)
+            flight, used, current = [], takeoff, 0
+        used += matrix[current, point]
+        flight.append(point - 1)
+        current = point
+    if flight:
+        flights.append(flight)
+        flight_costs.append(used + matrix[current, 0] + land)
+    return flights, [float(cost) for cost in flight_costs]
+
+# Orders waypoints for the least battery with nearest neighbour plus 2-opt over the cached
+# pairwise cost matrix, then splits the tour into flights that each fit one battery.
+def plan_mission(waypoints, battery_consumption, home=(0, 0, 0), grid=None, battery=100, reserve=0,
+                 folder=cache_folder, max_workers=None):
+    waypoints = [tuple(int(value) for value in waypoint[:3]) for waypoint in waypoints]
+    home = tuple(home[:3])
+    matrix = cached_cost_matrix([home] + waypoints, battery_consumption, grid, folder, max_workers)
+    tour = two_opt(nearest_neighbour_tour(matrix), matrix)
+    flights, flight_costs = split_flights(tour, matrix, battery_consumption, battery, reserve)
+    return MissionPlan(waypoints, home, [int(point) - 1 for point in tour[1:-1]], flights, flight_costs)
+
+# Reads waypoints from a text file with one 'x,y,z' per line; '#' starts a comment.
+def read_waypoints(filename):
+    waypoints = []
+    with open(filename) as file:
+        for line_number, line in enumerate(file, start=1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            try:
+                x, y, z = (int(value) for value in line.split(','))
+            except ValueError:
+                raise ValueError(f"{filename}:{line_number}: expected 'x,y,z', got {line!r}")
+            waypoints.append((x, y, z))
+    return waypoints
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python mission_planner.py WAYPOINT_FILE")
+        sys.exit(1)
+    command_battery = ConsumptionModel.load()
+    plan = plan_mission(read_waypoints(sys.argv[1]), command_battery, grid=load_default_grid())
+    print(plan.describe())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import os
+import numpy as np
+
+grid_file = './occupancy_grid.txt'
+
+# Blocked (no-fly) cells of an operating area, one bit per cell. The grid covers shape cells
+# starting at origin; cells outside it count as blocked so planners stay inside the area.
+#
+# Grids are loaded from a text file with one entry per line ('#' starts a comment):
+#   size X Y Z              cells along each axis (required)
+#   origin X Y Z            coordinates of the first cell (default 0 0 0)
+#   box X0 Y0 Z0 X1 Y1 Z1   block every cell between the two corners, inclusive
+#   cell X Y Z              block one cell
+# or from the packed .npz written by save().
+class OccupancyGrid:
+    def __init__(self, shape, origin=(0, 0, 0), bits=None):
+        self.shape = tuple(int(size) for size in shape)
+        self.origin = tuple(int(value) for value in origin)
+        num_cells = self.shape[0] * self.shape[1] * self.shape[2]
+        if bits is None:
+            bits = np.zeros((num_cells + 7) // 8, dtype=np.uint8)
+        self.bits = np.asarray(bits, dtype=np.uint8)
+        self.packed = self.bits.tobytes()
+
+    def cell_index(self, position):
+        x = position[0] - self.origin[0]
+        y = position[1] - self.origin[1]
+        z = position[2] - self.origin[2]
+        if 0 <= x < self.shape[0] and 0 <= y < self.shape[1] and 0 <= z < self.shape[2]:
+            return (x * self.shape[1] + y) * self.shape[2] + z
+        return None
+
+    def is_blocked(self, position):
+        index = self.cell_index(position)
+        return index is None or (self.packed[index >> 3] >> (index & 7)) & 1 == 1
+
+    def contains(self, position):
+        return self.cell_index(position) is not None
+
+    # Blocks every cell between two corners, inclusive.
+    def block(self, low, high):
+        self.block_boxes([(low, high)])
+
+    def block_boxes(self, boxes):
+        dense = self.to_dense()
+        for low, high in boxes:
+            slices = tuple(slice(max(min(low[axis], high[axis]) - self.origin[axis], 0),
+                                 max(max(low[axis], high[axis]) - self.origin[axis] + 1, 0)) for axis in range(3))
+            dense[slices] = True
+        self.set_dense(dense)
+
+    def to_dense(self):
+        num_cells = self.shape[0] * self.shape[1] * self.shape[2]
+        return np.unpackbits(self.bits, count=num_cells, bitorder='little').astype(bool).reshape(self.shape)
+
+    def set_dense(self, dense):
+        self.bits = np.packbits(dense.reshape(-1), bitorder='little')
+        self.packed = self.bits.tobytes()
+
+    # Boolean mask of blocked cells for the box of the given shape starting at origin; cells
+    # outside the grid are blocked.
+    def region(self, origin, shape):
+        mask = np.ones(shape, dtype=bool)
+        dense = self.to_dense()
+        source = []
+        target = []
+        for axis in range(3):
+            start = max(origin[axis], self.origin[axis])
+            stop = min(origin[axis] + shape[axis], self.origin[axis] + self.shape[axis])
+            if start >= stop:
+                return mask
+            source.append(slice(start - self.origin[axis], stop - self.origin[axis]))
+            target.append(slice(start - origin[axis], stop - origin[axis]))
+        mask[tuple(target)] = dense[tuple(source)]
+        return mask
+
+    def save(self, filename):
+        np.savez(filename, shape=self.shape, origin=self.origin, bits=self.bits)
+
+    @classmethod
+    def load(cls, filename):
+        if filename.endswith('.npz'):
+            with np.load(filename) as data:
+                return cls(data['shape'], data['origin'], data['bits'])
+
+        shape = None
+        origin = (0, 0, 0)
+        boxes = []
+        with open(filename) as file:
+            for line_number, line in enumerate(file, 1):
+                fields = line.split('#', 1)[0].split()
+                if not fields:
+                    continue
+                keyword, values = fields[0].lower(), fields[1:]
+                try:
+                    values = [int(value) for value in values]
+                except ValueError:
+                    raise ValueError(f"{filename}:{line_number}: coordinates must be integers")
+                if keyword == 'size' and len(values) == 3:
+                    shape = values
+                elif keyword == 'origin' and len(values) == 3:
+                    origin = values
+                elif keyword == 'box' and len(values) == 6:
+                    boxes.append((values[:3], values[3:]))
+                elif keyword == 'cell' and len(values) == 3:
+                    boxes.append((values, values))
+                else:
+                    raise ValueError(f"{filename}:{line_number}: invalid entry: {line.strip()}")
+        if shape is None:
+            raise ValueError(f"{filename}: missing 'size' entry")
+
+        grid = cls(shape, origin)
+        grid.block_boxes(boxes)
+        return grid
+
+# The operating area's grid if grid_file exists, otherwise None (open space).
+def load_default_grid(filename=grid_file):
+    if os.path.isfile(filename):
+        return OccupancyGrid.load(filename)
+    return None
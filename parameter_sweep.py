@@ -0,0 +1,120 @@
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from create_CSV import commands_battery, iter_flight_batches, takeoff_code, land_code
+from drone_commands import commands
+
+# Flights simulated for every configuration of a sweep.
+flights_per_config = 100000
+
+# Example what-if study: flips costing around 3% instead of 1.5-2.5%, with and without a
+# more expensive descent.
+example_grid = {
+    'flip': [(1.5, 2.5), (2.5, 3.5)],
+    'down': [(1.0, 1.4), (1.2, 1.8)],
+}
+
+flight_percentiles = [5, 50, 95]
+
+# Every combination of the ranges in grid, a dict mapping a command to the consumption ranges to
+# try for it, applied on top of base (create_CSV.commands_battery by default). Commands not in
+# grid keep their base range. Returns (settings, commands_battery) pairs where settings holds
+# the ranges that were swapped in. The generator never flies 'up' (its range is only used as the
+# takeoff drain), so 'up' can't be swept, and every range needs 0 < low <= high.
+def config_grid(grid, base=commands_battery):
+    names = list(grid)
+    for command in names:
+        if all(command != name for name, _ in base):
+            raise ValueError(f"Unknown command in sweep grid: {command}")
+        if command == base[0][0]:
+            raise ValueError(f"Can't sweep '{command}': the generator only uses its range as the takeoff drain.")
+        for low, high in grid[command]:
+            if not 0 < low <= high:
+                raise ValueError(f"Invalid consumption range for {command}: ({low}, {high}), expected 0 < low <= high")
+    configs = []
+    for ranges in itertools.product(*(grid[command] for command in names)):
+        settings = dict(zip(names, (tuple(consumption) for consumption in ranges)))
+        configs.append((settings, [(name, settings.get(name, consumption)) for name, consumption in base]))
+    return configs
+
+# Monte Carlo for one configuration. Only running totals are kept per batch: flight lengths
+# (commands flown between takeoff and land) are counted in a histogram, which is bounded by the
+# generator's longest possible flight, so memory doesn't grow with num_flights. Returns the
+# length histogram and per-command counts and consumption moments.
+def run_config(config_battery, num_flights, seed):
+    length_counts = np.zeros(0, dtype=np.int64)
+    counts = np.zeros(len(commands), dtype=np.int64)
+    sums = np.zeros(len(commands))
+    squares = np.zeros(len(commands))
+    for batch_commands, consumptions, offsets in iter_flight_batches(config_battery, num_flights, seed):
+        batch_counts = np.bincount(np.diff(offsets) - 2, minlength=len(length_counts))
+        batch_counts[:len(length_counts)] += length_counts
+        length_counts = batch_counts
+        consumptions = consumptions.astype(np.float64)
+        counts += np.bincount(batch_commands, minlength=len(commands))
+        sums += np.bincount(batch_commands, weights=consumptions, minlength=len(commands))
+        squares += np.bincount(batch_commands, weights=consumptions * consumptions, minlength=len(commands))
+    return length_counts, counts, sums, squares
+
+# Percentiles of the values a histogram counts (value i counted length_counts[i] times), with
+# the linear interpolation np.percentile uses on the values themselves.
+def histogram_percentiles(length_counts, percentiles):
+    cumulative = np.cumsum(length_counts)
+    positions = np.asarray(percentiles, dtype=np.float64) / 100 * (cumulative[-1] - 1)
+    below = np.searchsorted(cumulative, np.floor(positions), side='right')
+    above = np.searchsorted(cumulative, np.ceil(positions), side='right')
+    return below + (above - below) * (positions - np.floor(positions))
+
+# Rows of the sweep table for one configuration: one 'flight_length' row, then one
+# 'consumption' row per command that was flown.
+def summarize(index, settings, num_flights, length_counts, counts, sums, squares):
+    label = ', '.join(f'{command}={low:g}-{high:g}' for command, (low, high) in settings.items()) or 'base'
+    rows = []
+    flights = int(length_counts.sum())
+    if flights:
+        values = np.arange(len(length_counts))
+        mean = (values * length_counts).sum() / flights
+        std = np.sqrt((length_counts * (values - mean) ** 2).sum() / flights)
+        percentiles = histogram_percentiles(length_counts, flight_percentiles)
+    else:
+        mean, std, percentiles = np.nan, np.nan, [np.nan] * len(flight_percentiles)
+    rows.append([index, label, 'flight_length', 'all', flights, mean, std, *percentiles, np.nan])
+    for code in np.flatnonzero(counts):
+        mean = sums[code] / counts[code]
+        std = np.sqrt(max(squares[code] / counts[code] - mean * mean, 0.0))
+        per_flight = counts[code] / num_flights if code not in (takeoff_code, land_code) else 1.0
+        rows.append([index, label, 'consumption', commands[code], int(counts[code]), mean, std,
+                     *[np.nan] * len(flight_percentiles), per_flight])
+    return rows
+
+sweep_columns = (['config', 'settings', 'statistic', 'command', 'count', 'mean', 'std']
+                 + [f'p{percentile}' for percentile in flight_percentiles] + ['per_flight'])
+
+# Runs the Monte Carlo for every (settings, commands_battery) config from config_grid in a process
+# pool. Each config draws from its own generator spawned from one SeedSequence, so results don't
+# depend on the number of workers or the order configs finish in, and the whole sweep is
+# reproducible from seed. Returns a long-format DataFrame with sweep_columns.
+def run_sweep(configs, num_flights=flights_per_config, seed=None, max_workers=None):
+    seeds = np.random.SeedSequence(seed).spawn(len(configs))
+    batteries = [config_battery for _, config_battery in configs]
+    if max_workers == 1:
+        results = list(map(run_config, batteries, [num_flights] * len(configs), seeds))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(run_config, batteries, [num_flights] * len(configs), seeds))
+    rows = []
+    for index, ((settings, _), result) in enumerate(zip(configs, results)):
+        rows.extend(summarize(index, settings, num_flights, *result))
+    return pd.DataFrame(rows, columns=sweep_columns)
+
+def main():
+    configs = config_grid(example_grid)
+    table = run_sweep(configs)
+    flights = table[table['statistic'] == 'flight_length']
+    print(flights[['config', 'settings', 'count', 'mean', 'std', 'p5', 'p50', 'p95']].to_string(index=False))
+    table.to_csv('parameter_sweep.csv', index=False)
+    print(f'Sweep of {len(configs)} configurations written to parameter_sweep.csv')
+
+if __name__ == "__main__":
+    main()
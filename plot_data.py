@@ -1,112 +1,271 @@
 import os
+import json
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+from consumption_model import ConsumptionModel, cache_filename
+from drone_commands import command_deltas
+from flight_logs import find_logs, read_logs, read_csvs
 
-def read_csvs(folder_path):
-    dataframes = []
-    for i in range(1, 101):
-        file_name = f'battery_consumption_data_{i}.csv'
-        file_path = os.path.join(folder_path, file_name)
-        if os.path.isfile(file_path):
-            df = pd.read_csv(file_path)
-            print(f'Read CSV: {file_path}')
-            print(df.head())
-            dataframes.append(df)
-    return dataframes
-
-def plot_drone_motion(dataframes):
+average_file = './average_battery_consumption/average_battery_data.csv'
+manifest_file = './average_battery_consumption/average_battery_manifest.json'
+
+# Rebuilds every flight's path in one pass: each command is mapped to its (X, Y, Z) step through
+# the shared command table, and the steps are summed cumulatively within each flight. Takeoff and land rows
+# are skipped. Returns {flight: int32 array of shape (moves, 3)}, all views into one array.
+def flight_trajectories(df):
+    moves = ~df['Command'].isin(['takeoff', 'land']).to_numpy()
+    flights = df['flight'].to_numpy()[moves]
+    steps = command_deltas[df['Command'].cat.codes.to_numpy()[moves], :3]
+
+    order = np.argsort(flights, kind='stable')
+    flights = flights[order]
+    positions = np.cumsum(steps[order], axis=0, dtype=np.int32)
+    flight_ids, starts = np.unique(flights, return_index=True)
+    ends = np.append(starts[1:], len(flights))
+    # Subtract the running total reached before each flight so every flight starts from the origin.
+    before = np.zeros((len(starts), 3), dtype=np.int32)
+    before[1:] = positions[starts[1:] - 1]
+    positions -= np.repeat(before, ends - starts, axis=0)
+
+    return {flight: positions[start:end] for flight, start, end in zip(flight_ids.tolist(), starts, ends)}
+
+# Above this many flights plot_drone_motion packs flights into shared traces instead of one trace each.
+max_flight_traces = 100
+
+# Points the drone motion figure keeps by default, so its HTML stays loadable however many flights
+# there are. Paths are thinned to at most every max_point_step-th point before flights are sampled.
+max_motion_points = 200000
+max_point_step = 8
+
+# Keeps every point_step-th point of a path, always including its last point.
+def decimate(positions, point_step):
+    if point_step <= 1 or len(positions) <= 2:
+        return positions
+    keep = np.arange(0, len(positions), point_step)
+    if keep[-1] != len(positions) - 1:
+        keep = np.append(keep, len(positions) - 1)
+    return positions[keep]
+
+# Picks whichever of point_step and max_flights isn't given so paths of the given lengths come to
+# about max_points points: thinning every path first, as every flight still shows, and sampling
+# flights only once paths are thinned to max_point_step.
+def point_budget(lengths, max_points=max_motion_points, max_flights=None, point_step=None):
+    lengths = np.asarray(lengths, dtype=np.int64)
+    if point_step is None:
+        point_step = int(min(max_point_step, max(1, -(-lengths.sum() // max_points))))
+    # decimate keeps every point_step-th point plus the last one.
+    kept = np.minimum(lengths, -(-lengths // point_step) + 1).sum()
+    if max_flights is None and kept > max_points:
+        max_flights = max(1, int(len(lengths) * max_points / kept))
+    return max_flights, point_step
+
+# Joins paths into one array with a NaN row between consecutive paths, so a single trace draws
+# them as separate lines.
+def pack_paths(paths):
+    gap = np.full((1, 3), np.nan, dtype=np.float32)
+    parts = []
+    for positions in paths:
+        if parts:
+            parts.append(gap)
+        parts.append(positions.astype(np.float32))
+    return np.concatenate(parts) if parts else np.empty((0, 3), dtype=np.float32)
+
+# Every figure is saved as a static image and as an HTML fragment that loads plotly from its CDN,
+# both named after path_stem.
+figure_formats = ('png', 'html')
+
+def write_figure(fig, path_stem, formats=figure_formats):
+    for extension in formats:
+        if extension == 'png':
+            fig.write_image(f'{path_stem}.png', width=1200, height=800)
+        else:
+            fig.write_html(f'{path_stem}.html', full_html=False, include_plotlyjs='cdn')
+
+# Draws flight paths in 3D. With packed=None flights get their own trace up to max_flight_traces and
+# are otherwise packed into one trace per colour group (flight i goes to group i % num_groups).
+# max_flights samples that many flights (seeded) and point_step keeps every n-th point of each path;
+# those not given are picked by point_budget to keep about max_points points (None keeps them all).
+# Returns the figure and the number of traces and points in it.
+def drone_motion_figure(df, packed=None, num_groups=None, max_flights=None, point_step=None, seed=0,
+                        max_points=max_motion_points):
     fig = px.line_3d(title='Drone Motion')
     colors = px.colors.qualitative.Set1
-    for i, df in enumerate(dataframes):
-        current_position = {'X': 0, 'Y': 0, 'Z': 0}
-        color = colors[i % len(colors)]
-        positions = []
-        for index, row in df.iterrows():
-            command = row['Command']
-            if command in ['takeoff', 'land']:
-                continue
-
-            movement = get_movement(command)
-            current_position = update_position(current_position, movement)
-            positions.append(current_position)
+    trajectories = list(flight_trajectories(df).items())
+    if max_points is not None:
+        max_flights, point_step = point_budget([len(positions) for _, positions in trajectories],
+                                               max_points, max_flights, point_step)
+    point_step = point_step or 1
+    if max_flights is not None and len(trajectories) > max_flights:
+        picks = np.sort(np.random.default_rng(seed).choice(len(trajectories), max_flights, replace=False))
+        trajectories = [trajectories[i] for i in picks]
+    trajectories = [(flight, decimate(positions, point_step)) for flight, positions in trajectories]
+    if packed is None:
+        packed = len(trajectories) > max_flight_traces
 
-        x_coords = [pos['X'] for pos in positions]
-        y_coords = [pos['Y'] for pos in positions]
-        z_coords = [pos['Z'] for pos in positions]
+    if packed:
+        num_groups = num_groups or len(colors)
+        traces = []
+        for group in range(min(num_groups, len(trajectories))):
+            group_paths = [positions for _, positions in trajectories[group::num_groups]]
+            traces.append((f'Flights group {group + 1} ({len(group_paths)} flights)', pack_paths(group_paths)))
+    else:
+        traces = [(f'Flight {flight}', positions) for flight, positions in trajectories]
 
+    num_points = 0
+    for i, (name, positions) in enumerate(traces):
+        color = colors[i % len(colors)]
+        num_points += len(positions)
         fig.add_trace(go.Scatter3d(
-            x=x_coords,
-            y=y_coords,
-            z=z_coords,
+            x=positions[:, 0],
+            y=positions[:, 1],
+            z=positions[:, 2],
             mode='lines',
             line=dict(color=color, width=4),
-            name=f'Flight {i + 1}'
+            name=name
         ))
 
-    fig.write_image('drone_motion_final.png', width=1200, height=800)
-    fig.write_html('drone_motion_final.html', full_html=False, include_plotlyjs='cdn')
-
-def get_movement(command):
-    movements = {
-        'forward': {'X': 0, 'Y': 1, 'Z': 0},
-        'back': {'X': 0, 'Y': -1, 'Z': 0},
-        'left': {'X': -1, 'Y': 0, 'Z': 0},
-        'right': {'X': 1, 'Y': 0, 'Z': 0},
-        'up': {'X': 0, 'Y': 0, 'Z': 1},
-        'down': {'X': 0, 'Y': 0, 'Z': -1},
-        'cw': {'X': 0, 'Y': 0, 'Z': 0},
-        'ccw': {'X': 0, 'Y': 0, 'Z': 0},
-        'flip': {'X': 0, 'Y': 0, 'Z': 0},
-    }
-    return movements.get(command, {'X': 0, 'Y': 0, 'Z': 0})
-
-def update_position(current_position, movement):
-    new_position = {
-        'X': current_position['X'] + movement['X'],
-        'Y': current_position['Y'] + movement['Y'],
-        'Z': current_position['Z'] + movement['Z'],
-    }
-    return new_position
-
-def plot_battery_consumption(dataframes):
-    consumption_data = {'Command': [], 'Battery Consumption (%)': [], 'Flight': []}
-    for i, df in enumerate(dataframes):
-        for index, row in df.iterrows():
-            command = row['Command']
-            consumption = row['Battery Consumption (%)']
-            consumption_data['Command'].append(command)
-            consumption_data['Battery Consumption (%)'].append(consumption)
-            consumption_data['Flight'].append(i + 1)
-
-    avg_consumption = pd.DataFrame(consumption_data).groupby(['Command', 'Flight']).mean().reset_index()
-    fig = px.bar(avg_consumption, x='Command', y='Battery Consumption (%)',
-                 color='Command', title='Battery Consumption per Command')
-    fig.write_image('battery_consumption_final.png', width=1200, height=800)
-    fig.write_html('battery_consumption_final.html', full_html=False, include_plotlyjs='cdn')
-    
-def plot_average_battery_consumption(dataframes):
-    avg_consumption = pd.concat(dataframes).groupby('Command')['Battery Consumption (%)'].mean().reset_index()
+    print(f'Drone motion: {len(traces)} traces, {num_points} points from {len(trajectories)} flights')
+    return fig, len(traces), num_points
+
+def plot_drone_motion(df, packed=None, num_groups=None, max_flights=None, point_step=None, seed=0,
+                      max_points=max_motion_points):
+    fig, num_traces, num_points = drone_motion_figure(df, packed, num_groups, max_flights, point_step, seed, max_points)
+    write_figure(fig, 'drone_motion_final')
+    return num_traces, num_points
+
+# Mean consumption of each command within each flight.
+def flight_command_means(df):
+    return df.groupby(['Command', 'flight'], observed=True)['Battery Consumption (%)'].mean().reset_index()
+
+def battery_consumption_figure(flight_means):
+    return px.bar(flight_means, x='Command', y='Battery Consumption (%)',
+                  color='Command', title='Battery Consumption per Command')
+
+def plot_battery_consumption(df):
+    write_figure(battery_consumption_figure(flight_command_means(df)), 'battery_consumption_final')
+
+def average_battery_consumption(df):
+    consumption = df['Battery Consumption (%)'].astype(np.float64)
+    avg_consumption = consumption.groupby(df['Command'], observed=True).mean().reset_index()
+    avg_consumption['Command'] = avg_consumption['Command'].astype(str)
+    return avg_consumption.sort_values('Command', ignore_index=True)
+
+def average_consumption_figure(avg_consumption):
     fig = px.line(avg_consumption, x='Command', y='Battery Consumption (%)', title='Average Battery Consumption per Command')
     fig.update_traces(mode='lines+markers+text', text=avg_consumption['Battery Consumption (%)'], textposition='top center', textfont_size=8)
     fig.update_layout(xaxis_title='Command', yaxis_title='Average Battery Consumption (%)')
-    fig.write_image('./average_battery_consumption/average_battery_consumption.png', width=1200, height=800)
-    fig.write_html('./average_battery_consumption/average_battery_consumption.html', full_html=False, include_plotlyjs='cdn')
+    return fig
+
+def plot_average_battery_consumption(avg_consumption):
+    write_figure(average_consumption_figure(avg_consumption), './average_battery_consumption/average_battery_consumption')
     return avg_consumption
 
+# Per-command p50/p95/p99 drain from a consumption_sketch summary, as grouped bars.
+def plot_consumption_quantiles(summary):
+    columns = [column for column in summary.columns if column.startswith('p')]
+    quantiles = summary.melt(id_vars='Command', value_vars=columns, var_name='Quantile', value_name='Battery Consumption (%)')
+    fig = px.bar(quantiles, x='Command', y='Battery Consumption (%)', color='Quantile', barmode='group',
+                 title='Battery Consumption Quantiles per Command')
+    write_figure(fig, './average_battery_consumption/consumption_quantiles')
+
+# Writes the average table with CRLF line endings, as the committed file has, leaving the file
+# untouched if its contents wouldn't change.
+# Returns whether the file was written.
 def write_average_to_csv(avg_data, filename):
-    avg_data.to_csv(filename, index=False)
+    text = avg_data[['Command', 'Battery Consumption (%)']].to_csv(index=False, lineterminator='\r\n')
+    if os.path.isfile(filename):
+        with open(filename, newline='') as file:
+            if file.read() == text:
+                return False
+    with open(filename, mode='w', newline='') as file:
+        file.write(text)
+    return True
+
+# Combines two per-command [count, mean, m2] summaries, where m2 is the sum of squared deviations
+# from the mean (Welford / Chan et al.).
+def merge_stats(a, b):
+    count = a[0] + b[0]
+    if count == 0:
+        return [0, 0.0, 0.0]
+    delta = b[1] - a[1]
+    mean = a[1] + delta * b[0] / count
+    m2 = a[2] + b[2] + delta * delta * a[0] * b[0] / count
+    return [count, mean, m2]
+
+def log_signature(file_path):
+    stat = os.stat(file_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+# Brings the running per-command statistics in manifest_path up to date with the logs in
+# folder_path. Only logs missing from the manifest are read and folded in; if a known log changed
+# or disappeared its old rows can't be taken back out, so the aggregate is rebuilt from scratch.
+# Returns the manifest and whether it changed.
+def update_average_aggregate(folder_path, manifest_path=manifest_file, max_workers=None):
+    manifest = {'files': {}, 'commands': {}}
+    if os.path.isfile(manifest_path):
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+
+    file_paths, flights = find_logs(folder_path)
+    signatures = {os.path.normpath(path): log_signature(path) for path in file_paths}
+    reset = any(signatures.get(path) != signature for path, signature in manifest['files'].items())
+    if reset:
+        manifest = {'files': {}, 'commands': {}}
 
+    new_logs = [(path, flight) for path, flight in zip(file_paths, flights)
+                if os.path.normpath(path) not in manifest['files']]
+    if not new_logs and not reset and os.path.isfile(manifest_path):
+        return manifest, False
+
+    df = read_logs([path for path, _ in new_logs], [flight for _, flight in new_logs], max_workers)
+    consumption = df['Battery Consumption (%)'].astype(np.float64)
+    grouped = consumption.groupby(df['Command'], observed=True)
+    stats = pd.DataFrame({'count': grouped.count(), 'mean': grouped.mean(), 'var': grouped.var(ddof=0)})
+    for command, row in stats.iterrows():
+        new_stats = [int(row['count']), row['mean'], row['var'] * row['count']]
+        manifest['commands'][command] = merge_stats(manifest['commands'].get(command, [0, 0.0, 0.0]), new_stats)
+    for path, _ in new_logs:
+        manifest['files'][os.path.normpath(path)] = signatures[os.path.normpath(path)]
+
+    with open(manifest_path, mode='w') as file:
+        json.dump(manifest, file)
+    return manifest, True
+
+# Average table from an aggregate manifest, with the count and sample standard deviation of each command.
+def average_from_aggregate(manifest):
+    rows = []
+    for command in sorted(manifest['commands']):
+        count, mean, m2 = manifest['commands'][command]
+        std = np.sqrt(m2 / (count - 1)) if count > 1 else 0.0
+        rows.append((command, mean, count, std))
+    return pd.DataFrame(rows, columns=['Command', 'Battery Consumption (%)', 'count', 'std'])
+
+# The aggregate only reads logs it hasn't seen. The full history is read at most once, and only if
+# the average table changed or a figure drawn from every log is out of date; the figures over all
+# logs are keyed by the log signatures in the manifest rather than by their data.
 def main():
     folder_path = './battery_consumption'
-    dataframes = read_csvs(folder_path)
-    
-    print('Dataframes:', dataframes)
-    print('Number of Dataframes:', len(dataframes))
-
-    plot_drone_motion(dataframes)
-    plot_battery_consumption(dataframes)
-    write_average_to_csv(plot_average_battery_consumption(dataframes), filename = './average_battery_consumption/average_battery_data.csv')
-    
+    manifest, _ = update_average_aggregate(folder_path)
+    avg_consumption = average_from_aggregate(manifest)
+
+    logs = {}
+    def all_logs():
+        if 'df' not in logs:
+            logs['df'] = read_csvs(folder_path)
+            print(f'Read {logs["df"]["flight"].nunique()} flights ({len(logs["df"])} commands) from {folder_path}')
+        return logs['df']
+
+    if write_average_to_csv(avg_consumption, filename=average_file):
+        ConsumptionModel.from_frame(all_logs()).save(cache_filename(average_file))
+
+    # Only figures whose input data changed since the last run are redrawn, in parallel.
+    from render_figures import render_figures, print_timings
+    logs_key = json.dumps(sorted(manifest['files'].items()))
+    print_timings(render_figures({'drone_motion': (logs_key, lambda: all_logs()[['flight', 'Command']]),
+                                  'battery_consumption': (logs_key, lambda: flight_command_means(all_logs())),
+                                  'average_battery_consumption': avg_consumption}))
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,92 @@
+import os
+import json
+import numpy as np
+from consumption_model import ConsumptionModel
+from cost_to_go import cost_to_go_field
+
+map_file = './average_battery_consumption/range_map.npy'
+
+# Half-widths of the default map in cells: offsets of up to map_radius along x and y and
+# map_height along z are covered.
+map_radius = 100
+map_height = 30
+
+# Battery values are stored as uint16 hundredths of a percent, rounded up so the map never
+# promises a trip the battery can't make. The largest value marks offsets that can't be reached.
+scale = 100
+unreachable = np.iinfo(np.uint16).max
+
+# Minimum battery (%) needed to fly between any two cells, plus the cost to land, as one compact
+# grid. Moves cost the same everywhere, so a trip only depends on its offset: costs[offset] holds
+# the cheapest trip from a cell back to one `offset` away from it, and a trip from X to Y is the
+# entry for X - Y. Any query is then a single array lookup.
+class RangeMap:
+    def __init__(self, costs, land_cost, takeoff_cost):
+        self.costs = costs
+        self.center = tuple(size // 2 for size in costs.shape)
+        self.land_cost = land_cost
+        self.takeoff_cost = takeoff_cost
+
+    @classmethod
+    def build(cls, battery_consumption, radius=map_radius, height=map_height):
+        shape = (2 * radius + 1, 2 * radius + 1, 2 * height + 1)
+        field = cost_to_go_field((0, 0, 0), battery_consumption, (-radius, -radius, -height), shape)
+        costs = np.ceil(field.costs.astype(np.float64) * scale)
+        costs = np.where(costs < unreachable, costs, unreachable).astype(np.uint16)
+        return cls(costs, battery_consumption['land'], battery_consumption['takeoff'])
+
+    def save(self, filename=map_file):
+        np.save(filename, self.costs)
+        with open(metadata_filename(filename), mode='w') as file:
+            json.dump({'land_cost': self.land_cost, 'takeoff_cost': self.takeoff_cost}, file)
+
+    # Loads a saved map. By default the grid is memory-mapped rather than read into memory.
+    @classmethod
+    def load(cls, filename=map_file, mmap=True):
+        costs = np.load(filename, mmap_mode='r' if mmap else None)
+        with open(metadata_filename(filename)) as file:
+            metadata = json.load(file)
+        return cls(costs, metadata['land_cost'], metadata['takeoff_cost'])
+
+    # Battery (%) needed to fly from start to end, or inf when the offset is outside the map.
+    def trip_cost(self, start, end):
+        index = tuple(start[axis] - end[axis] + self.center[axis] for axis in range(3))
+        if not all(0 <= index[axis] < self.costs.shape[axis] for axis in range(3)):
+            return float('inf')
+        cost = int(self.costs[index])
+        return float('inf') if cost == unreachable else cost / scale
+
+    # Whether a flying drone at position with the given battery can reach destination and then
+    # either fly back home and land there, or land at the destination when return_home is False.
+    def can_reach(self, position, battery, destination, return_home=True, home=(0, 0, 0)):
+        needed = self.trip_cost(position, destination) + self.land_cost
+        if return_home:
+            needed += self.trip_cost(destination, home)
+        return battery >= needed
+
+    # Vectorized can_reach for many requests: positions and destinations are (n, 3) arrays and
+    # batteries an (n,) array. Returns a boolean array.
+    def can_reach_many(self, positions, batteries, destinations, return_home=True, home=(0, 0, 0)):
+        needed = self.trip_costs(positions, destinations) + self.land_cost
+        if return_home:
+            needed += self.trip_costs(destinations, np.broadcast_to(home, np.shape(destinations)))
+        return np.asarray(batteries) >= needed
+
+    def trip_costs(self, starts, ends):
+        index = np.asarray(starts) - np.asarray(ends) + np.array(self.center)
+        inside = np.all((index >= 0) & (index < np.array(self.costs.shape)), axis=1)
+        costs = np.full(len(index), np.inf)
+        values = self.costs[tuple(index[inside].T)]
+        costs[inside] = np.where(values == unreachable, np.inf, values / scale)
+        return costs
+
+def metadata_filename(filename):
+    return os.path.splitext(filename)[0] + '.json'
+
+def main():
+    range_map = RangeMap.build(ConsumptionModel.load())
+    range_map.save()
+    print(f'Range map saved to {map_file}: {range_map.costs.shape} cells, {range_map.costs.nbytes} bytes')
+
+if __name__ == "__main__":
+    main()
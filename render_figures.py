@@ -0,0 +1,100 @@
+import os
+import json
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import flight_logs
+import plot_data
+
+manifest_file = './average_battery_consumption/figure_manifest.json'
+
+# Figure name -> (function building it from its input data, output path without extension).
+figures = {
+    'drone_motion': (lambda df: plot_data.drone_motion_figure(df, max_points=plot_data.max_motion_points)[0],
+                     'drone_motion_final'),
+    'battery_consumption': (plot_data.battery_consumption_figure, 'battery_consumption_final'),
+    'average_battery_consumption': (plot_data.average_consumption_figure,
+                                    './average_battery_consumption/average_battery_consumption'),
+}
+
+# Hash of a figure's input together with the plotting and log reading code, so editing
+# plot_data.py or flight_logs.py redraws everything as well. An input given as a
+# (fingerprint, load) pair is hashed by its fingerprint string, without loading it.
+def input_hash(name, data):
+    digest = hashlib.sha1(name.encode())
+    for module in (plot_data, flight_logs):
+        with open(module.__file__, mode='rb') as file:
+            digest.update(file.read())
+    if isinstance(data, tuple):
+        digest.update(data[0].encode())
+        return digest.hexdigest()
+    digest.update(','.join(map(str, data.columns)).encode())
+    digest.update(','.join(map(str, data.dtypes)).encode())
+    digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def output_paths(name, formats=plot_data.figure_formats):
+    return [f'{figures[name][1]}.{extension}' for extension in formats]
+
+# Builds one figure and writes each of its formats, timing every step. A format that fails (e.g.
+# static export without kaleido) is reported with its error and the others are still written.
+def render_figure(name, data, formats=plot_data.figure_formats):
+    build, path_stem = figures[name]
+    start = time.perf_counter()
+    fig = build(data)
+    timings, errors = {'build': time.perf_counter() - start}, {}
+    for extension in formats:
+        start = time.perf_counter()
+        try:
+            plot_data.write_figure(fig, path_stem, (extension,))
+            timings[extension] = time.perf_counter() - start
+        except Exception as error:
+            errors[extension] = f'{type(error).__name__}: {(str(error).strip().splitlines() or [""])[0]}'
+    return name, timings, errors
+
+# Renders the figures in inputs ({name: input frame or (fingerprint, load)}) whose inputs changed
+# since the hashes stored in manifest_path, or whose outputs are missing, each in its own worker
+# process. Lazy inputs are only loaded for figures that are redrawn. Returns
+# {name: {'skipped': bool, 'timings': {...}, 'errors': {...}}}. A figure is only marked up to
+# date once all its outputs were written.
+def render_figures(inputs, manifest_path=manifest_file, max_workers=None, force=False):
+    manifest = {}
+    if os.path.isfile(manifest_path):
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+
+    results, stale, hashes = {}, [], {}
+    for name, data in inputs.items():
+        hashes[name] = input_hash(name, data)
+        if not force and manifest.get(name) == hashes[name] and all(map(os.path.isfile, output_paths(name))):
+            results[name] = {'skipped': True, 'timings': {}, 'errors': {}}
+        else:
+            stale.append(name)
+    data = {name: inputs[name][1]() if isinstance(inputs[name], tuple) else inputs[name] for name in stale}
+
+    if max_workers == 1 or len(stale) < 2:
+        rendered = [render_figure(name, data[name]) for name in stale]
+    else:
+        with ProcessPoolExecutor(max_workers=min(len(stale), max_workers or os.cpu_count() or 1)) as executor:
+            rendered = list(executor.map(render_figure, stale, [data[name] for name in stale]))
+
+    for name, timings, errors in rendered:
+        results[name] = {'skipped': False, 'timings': timings, 'errors': errors}
+        if errors:
+            manifest.pop(name, None)
+        else:
+            manifest[name] = hashes[name]
+    with open(manifest_path, mode='w') as file:
+        json.dump(manifest, file, indent=2)
+    return results
+
+def print_timings(results):
+    for name, result in results.items():
+        if result['skipped']:
+            print(f'{name:<28} up to date')
+            continue
+        steps = ', '.join(f'{step} {seconds:.2f} s' for step, seconds in result['timings'].items())
+        print(f'{name:<28} {steps}')
+        for extension, error in result['errors'].items():
+            print(f'{"":<28} {extension} failed ({error})')
@@ -0,0 +1,138 @@
+import math
+from drone_commands import command_ids, command_delta_tuples
+from event_log import NullSink
+
+# The simulated drone on its own, without the GUI, so headless tools (the CLI, the SDK server, log
+# replay and the benchmarks) can use it without Qt. numpy is only imported, with the cost-to-go
+# fields, once a move is first suggested.
+
+# Simulated Tello Drone class
+class SimulatedTello:
+    # Every action is emitted to events (see event_log); by default they are dropped. Actions
+    # return whether they were carried out.
+    def __init__(self, battery_consumption, grid=None, events=None):
+        self.battery_percentage = 100
+        self.battery_consumption = battery_consumption
+        self.destination = None
+        self.landed = True
+        self.position = (0, 0, 0)
+        self.grid = grid
+        self.events = NullSink() if events is None else events
+        self.cost_fields = None
+
+    def takeoff(self):
+        if self.landed:
+            battery_before = self.battery_percentage
+            self.battery_percentage -= self.battery_consumption['takeoff']
+            self.landed = False
+            self.events.emit('takeoff', battery_before, self.battery_percentage, self.position, "Drone is taking off.")
+            return True
+        self.report('takeoff', "Drone is already in the air. Cannot take off again.")
+        return False
+
+    def land(self):
+        if not self.landed:
+            battery_before = self.battery_percentage
+            self.battery_percentage -= self.battery_consumption['land']
+            self.landed = True
+            self.position = (0, 0, 0)
+            self.events.emit('land', battery_before, self.battery_percentage, self.position, "Drone is landing.")
+            return True
+        self.report('land', "Drone is already on the ground. Cannot land again.")
+        return False
+
+    # Flies one command's move, refusing it on the ground or into a blocked cell.
+    def move(self, command, message):
+        if self.landed:
+            self.report(command, "Drone has landed. Cannot execute move.")
+            return False
+        position = self.get_new_position(command)
+        if self.is_blocked(position):
+            self.report(command, "Path is blocked. Cannot execute move.")
+            return False
+        battery_before = self.battery_percentage
+        self.battery_percentage -= self.battery_consumption[command]
+        self.position = position
+        self.events.emit(command, battery_before, self.battery_percentage, self.position, message)
+        return True
+
+    def move_up(self):
+        return self.move('up', "Drone is moving up.")
+
+    def move_down(self):
+        return self.move('down', "Drone is moving down.")
+
+    def move_forward(self):
+        return self.move('forward', "Drone is moving forward.")
+
+    def move_backward(self):
+        return self.move('back', "Drone is moving backward.")
+
+    def move_left(self):
+        return self.move('left', "Drone is moving left.")
+
+    def move_right(self):
+        return self.move('right', "Drone is moving right.")
+
+    def rotate_clockwise(self):
+        return self.move('cw', "Drone is rotating clockwise.")
+
+    def rotate_counterclockwise(self):
+        return self.move('ccw', "Drone is rotating counterclockwise.")
+
+    def flip(self):
+        return self.move('flip', "Drone is flipping forward.")
+
+    def print_battery_status(self):
+        return f"Battery Percentage: {self.battery_percentage}%"
+
+    def predict_next_move(self):
+        if self.destination is not None:
+            current_position = self.position
+            destination_distance = math.sqrt(sum((x - y) ** 2 for x, y in zip(current_position, self.destination)))
+            if destination_distance < 1:
+                self.land()
+                return "Destination Reached. Drone Landed."
+            else:
+                return self.suggest_move(self.position, self.battery_percentage, self.destination)
+        else:
+            return "No destination set."
+
+    # Picks the affordable move from position that leaves the least battery still needed to reach
+    # destination, using the cached cost-to-go field for it. Touches nothing but the field cache,
+    # so the GUI runs it on a snapshot of the drone's state in its (single) worker thread.
+    def suggest_move(self, position, battery, destination):
+        if self.cost_fields is None:
+            from cost_to_go import CostToGoCache
+            self.cost_fields = CostToGoCache(self.battery_consumption, grid=self.grid)
+        field = self.cost_fields.field(destination, position)
+        movements = ['up', 'down', 'forward', 'back', 'left', 'right', 'cw', 'ccw', 'flip']
+        best_move = None
+        min_cost = float('inf')
+        for move in movements:
+            move_cost = self.battery_consumption[move]
+            if move_cost > battery:
+                continue
+            total_cost = move_cost + field.cost(self.get_new_position(move, position))
+            if total_cost < min_cost:
+                min_cost = total_cost
+                best_move = move
+        if best_move is None or min_cost == float('inf'):
+            return "Not enough battery for any move towards the destination."
+        if min_cost > battery:
+            return f"Predicted Next Move: {best_move.capitalize()} (destination needs {min_cost:.2f}% battery)"
+        return f"Predicted Next Move: {best_move.capitalize()}"
+
+    def get_new_position(self, move, position=None):
+        if position is None:
+            position = self.position
+        dx, dy, dz, _ = command_delta_tuples[command_ids[move]]
+        return position[0] + dx, position[1] + dy, position[2] + dz
+
+    # Cells of the occupancy grid (if any) that are occupied or outside it can't be flown into.
+    def is_blocked(self, position):
+        return self.grid is not None and self.grid.is_blocked(position)
+
+    # Emits an event for a command that was refused and left the drone unchanged.
+    def report(self, command, message):
+        self.events.emit(command, self.battery_percentage, self.battery_percentage, self.position, message)
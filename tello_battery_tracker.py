@@ -1,151 +1,100 @@
 import sys
 import math
-import pandas as pd
-from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QLabel, QLineEdit, QMessageBox
-
-# Simulated Tello Drone class
-class SimulatedTello:
-    def __init__(self, battery_consumption):
-        self.battery_percentage = 100
-        self.battery_consumption = battery_consumption
-        self.destination = None
-        self.landed = True
-        self.position = (0, 0, 0)
-
-    def takeoff(self):
-        if self.landed:
-            self.show_message("Drone is taking off.")
-            self.battery_percentage -= self.battery_consumption['takeoff']
-            self.landed = False
-        else:
-            self.show_message("Drone is already in the air. Cannot take off again.")
-
-    def land(self):
-        if not self.landed:
-            self.show_message("Drone is landing.")
-            self.battery_percentage -= self.battery_consumption['land']
-            self.landed = True
-            self.position = (0, 0, 0)
-        else:
-            self.show_message("Drone is already on the ground. Cannot land again.")
-
-    def move_up(self):
-        if not self.landed:
-            self.show_message("Drone is moving up.")
-            self.battery_percentage -= self.battery_consumption['up']
-            self.position = (self.position[0], self.position[1], self.position[2] + 1)
-        else:
-            self.show_message("Drone has landed. Cannot execute move.")
-
-    def move_down(self):
-        if not self.landed:
-            self.show_message("Drone is moving down.")
-            self.battery_percentage -= self.battery_consumption['down']
-            self.position = (self.position[0], self.position[1], self.position[2] - 1)
-        else:
-            self.show_message("Drone has landed. Cannot execute move.")
-
-    def move_forward(self):
-        if not self.landed:
-            self.show_message("Drone is moving forward.")
-            self.battery_percentage -= self.battery_consumption['forward']
-            self.position = (self.position[0] + 1, self.position[1], self.position[2])
-        else:
-            self.show_message("Drone has landed. Cannot execute move.")
-
-    def move_backward(self):
-        if not self.landed:
-            self.show_message("Drone is moving backward.")
-            self.battery_percentage -= self.battery_consumption['back']
-            self.position = (self.position[0] - 1, self.position[1], self.position[2])
-        else:
-            self.show_message("Drone has landed. Cannot execute move.")
-
-    def move_left(self):
-        if not self.landed:
-            self.show_message("Drone is moving left.")
-            self.battery_percentage -= self.battery_consumption['left']
-            self.position = (self.position[0], self.position[1] - 1, self.position[2])
-        else:
-            self.show_message("Drone has landed. Cannot execute move.")
-
-    def move_right(self):
-        if not self.landed:
-            self.show_message("Drone is moving right.")
-            self.battery_percentage -= self.battery_consumption['right']
-            self.position = (self.position[0], self.position[1] + 1, self.position[2])
-        else:
-            self.show_message("Drone has landed. Cannot execute move.")
-
-    def rotate_clockwise(self):
-        if not self.landed:
-            self.show_message("Drone is rotating clockwise.")
-            self.battery_percentage -= self.battery_consumption['cw']
-        else:
-            self.show_message("Drone has landed. Cannot execute move.")
-
-    def rotate_counterclockwise(self):
-        if not self.landed:
-            self.show_message("Drone is rotating counterclockwise.")
-            self.battery_percentage -= self.battery_consumption['ccw']
-        else:
-            self.show_message("Drone has landed. Cannot execute move.")
-
-    def flip(self):
-        if not self.landed:
-            self.show_message("Drone is flipping forward.")
-            self.battery_percentage -= self.battery_consumption['flip']
-        else:
-            self.show_message("Drone has landed. Cannot execute move.")
-
-    def print_battery_status(self):
-        return f"Battery Percentage: {self.battery_percentage}%"
-
-    def predict_next_move(self):
-        if self.destination is not None:
-            current_position = self.position
-            destination_distance = math.sqrt(sum((x - y) ** 2 for x, y in zip(current_position, self.destination)))
-            if destination_distance < 1:
-                self.land()
-                return "Destination Reached. Drone Landed."
+from consumption_model import ConsumptionModel
+from occupancy_grid import load_default_grid
+from collections import deque
+from event_log import PrintSink, CallbackSink, TeeSink
+from simulated_tello import SimulatedTello
+from flight_estimator import RemainingFlightEstimator, expected, guaranteed
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, QPointF, Qt, pyqtSignal
+from PyQt5.QtGui import QPainter, QPen, QColor, QPolygonF
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QLabel, QLineEdit, QStatusBar
+
+# The live chart redraws at most chart_fps times a second and keeps the last chart_history events.
+chart_fps = 10
+chart_history = 500
+
+class TaskSignals(QObject):
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+# Runs function(*args) on a QThreadPool thread and reports back through signals, which Qt delivers
+# on the GUI thread. Every task that runs reports, even once cancelled (a cancelled task skips
+# function if it hasn't started yet), so the GUI can let go of it then and drop its result.
+class Task(QRunnable):
+    def __init__(self, function, *args):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.function = function
+        self.args = args
+        self.cancelled = False
+        self.signals = TaskSignals()
+
+    def run(self):
+        if self.cancelled:
+            self.signals.finished.emit(None)
+            return
+        try:
+            result = self.function(*self.args)
+        except Exception as error:
+            self.signals.failed.emit(str(error))
+            return
+        self.signals.finished.emit(result)
+
+# Battery and (x, y, z) position over the most recent events. New points only mark the chart as
+# stale; a timer repaints it at most chart_fps times a second however fast commands arrive.
+class LiveChart(QWidget):
+    series_colors = [QColor('#1f77b4'), QColor('#d62728'), QColor('#2ca02c'), QColor('#9467bd')]
+
+    def __init__(self, history=chart_history, fps=chart_fps):
+        super().__init__()
+        self.setMinimumHeight(120)
+        self.points = deque(maxlen=history)
+        self.stale = False
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.redraw)
+        self.timer.start(int(1000 / fps))
+
+    def add(self, battery, position):
+        self.points.append((battery,) + tuple(position[:3]))
+        self.stale = True
+
+    def redraw(self):
+        if self.stale:
+            self.stale = False
+            self.update()
+
+    # Battery is drawn against 0-100%; x, y and z share a scale that fits their largest offset.
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.white)
+        if len(self.points) < 2:
+            return
+        width, height = self.width() - 1, self.height() - 1
+        step = width / (len(self.points) - 1)
+        extent = max(1, max(abs(value) for point in self.points for value in point[1:]))
+        for series, color in enumerate(self.series_colors):
+            if series == 0:
+                scale = [height * (1 - min(max(point[0], 0), 100) / 100) for point in self.points]
             else:
-                movements = ['up', 'down', 'forward', 'back', 'left', 'right', 'cw', 'ccw', 'flip']
-                best_move = None
-                min_distance = float('inf')
-                for move in movements:
-                    new_position = self.get_new_position(move)
-                    move_distance = math.sqrt(sum((x - y) ** 2 for x, y in zip(new_position, self.destination)))
-                    if move_distance < min_distance:
-                        min_distance = move_distance
-                        best_move = move
-                return f"Predicted Next Move: {best_move.capitalize()}"
-        else:
-            return "No destination set."
-
-    def get_new_position(self, move):
-        if move == 'up':
-            return self.position[0], self.position[1], self.position[2] + 1
-        elif move == 'down':
-            return self.position[0], self.position[1], self.position[2] - 1
-        elif move == 'forward':
-            return self.position[0] + 1, self.position[1], self.position[2]
-        elif move == 'back':
-            return self.position[0] - 1, self.position[1], self.position[2]
-        elif move == 'left':
-            return self.position[0], self.position[1] - 1, self.position[2]
-        elif move == 'right':
-            return self.position[0], self.position[1] + 1, self.position[2]
-        else:
-            return self.position
-
-    def show_message(self, message):
-        print(message)
+                scale = [height * (0.5 - point[series] / (2 * extent)) for point in self.points]
+            painter.setPen(QPen(color, 1.5))
+            painter.drawPolyline(QPolygonF([QPointF(i * step, y) for i, y in enumerate(scale)]))
 
 # Class designed to deploy drone simulation GUI.
+# Commands run on the GUI thread; move predictions and remaining-flight estimates run one at a time
+# on a background thread, and a newer request cancels an older one of the same kind. Messages go
+# to a status bar rather than modal dialogs.
 class DroneGUI(QWidget):
     def __init__(self, drone):
         super().__init__()
         self.drone = drone
+        self.drone.events = TeeSink(drone.events, CallbackSink(self.on_drone_event))
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(1)
+        self.tasks = {}
+        self.cancelled_tasks = set()
+        self.estimator = None
         self.initUI()
 
     def initUI(self):
@@ -164,6 +113,12 @@ class DroneGUI(QWidget):
         self.position_label = QLabel()
         layout.addWidget(self.position_label)
 
+        self.estimate_label = QLabel()
+        layout.addWidget(self.estimate_label)
+
+        self.chart = LiveChart()
+        layout.addWidget(self.chart)
+
         self.destination_label = QLabel("Enter Destination (comma-separated coordinates):")
         layout.addWidget(self.destination_label)
 
@@ -188,9 +143,14 @@ class DroneGUI(QWidget):
         layout.addLayout(self.command_button_layout)
         self.create_command_buttons()
 
+        self.status_bar = QStatusBar()
+        layout.addWidget(self.status_bar)
+
         self.setLayout(layout)
         self.update_battery_status()
         self.update_position_status()
+        self.chart.add(self.drone.battery_percentage, self.drone.position)
+        self.request_estimate()
         self.show()
 
     def create_command_buttons(self):
@@ -209,19 +169,75 @@ class DroneGUI(QWidget):
         else:
             self.show_message("Invalid destination format.")
 
+    # Landing at the destination changes the drone, so it happens here; searching for the next
+    # move goes to the worker. Either way the remaining flight estimate is refreshed.
     def predict_move(self):
-        predicted_move = self.drone.predict_next_move()
-        self.show_message(predicted_move)
+        drone = self.drone
+        if drone.destination is None or math.dist(drone.position, drone.destination) < 1:
+            self.show_message(drone.predict_next_move())
+            self.update_battery_status()
+            self.update_position_status()
+        else:
+            self.show_message("Predicting next move...")
+            self.submit('predict', self.show_message, drone.suggest_move,
+                        drone.position, drone.battery_percentage, drone.destination)
+        self.request_estimate()
 
     def execute_command(self, command):
+        self.cancel('predict')
         getattr(self.drone, command)()
         self.update_battery_status()
         self.update_position_status()
+        self.request_estimate()
+
+    # What-if estimate of how much more the drone can fly on the battery it has left, keeping
+    # enough to land.
+    def request_estimate(self):
+        self.submit('estimate', self.estimate_label.setText, self.estimate_remaining, self.drone.battery_percentage)
+
+    def estimate_remaining(self, battery):
+        if self.estimator is None:
+            self.estimator = RemainingFlightEstimator.load()
+        pmf = self.estimator.remaining_commands(battery, reserve=self.drone.battery_consumption['land'])
+        return f"Remaining: ~{expected(pmf):.0f} commands ({guaranteed(pmf)} with 95% confidence)"
+
+    # Queues function(*args) on the worker, cancelling any earlier task of the same kind, and
+    # passes its result (or an error message) to on_result on the GUI thread.
+    def submit(self, kind, on_result, function, *args):
+        self.cancel(kind)
+        task = Task(function, *args)
+        task.signals.finished.connect(lambda result: self.finish(kind, task, on_result, result))
+        task.signals.failed.connect(lambda error: self.finish(kind, task, on_result, f"{kind.capitalize()} failed: {error}"))
+        self.tasks[kind] = task
+        self.pool.start(task)
+
+    def finish(self, kind, task, on_result, result):
+        self.cancelled_tasks.discard(task)
+        if not task.cancelled and self.tasks.get(kind) is task:
+            del self.tasks[kind]
+            on_result(result)
+
+    # A task taken back off the queue never runs; one already running is kept referenced until it
+    # reports, so Qt never runs a task Python has freed.
+    def cancel(self, kind):
+        task = self.tasks.pop(kind, None)
+        if task is not None:
+            task.cancelled = True
+            if not self.pool.tryTake(task):
+                self.cancelled_tasks.add(task)
+
+    def closeEvent(self, event):
+        for kind in list(self.tasks):
+            self.cancel(kind)
+        self.pool.waitForDone()
+        super().closeEvent(event)
+
+    def on_drone_event(self, command, battery_before, battery_after, position, message):
+        self.show_message(message)
+        self.chart.add(battery_after, position)
 
     def show_message(self, message):
-        msg_box = QMessageBox()
-        msg_box.setText(message)
-        msg_box.exec_()
+        self.status_bar.showMessage(message)
 
     def update_battery_status(self):
         battery_status = self.drone.print_battery_status()
@@ -233,22 +249,9 @@ class DroneGUI(QWidget):
 
 
 def main():
-    csv_file = './average_battery_consumption/average_battery_data.csv'
-    df = pd.read_csv(csv_file)
-    # Hardcoded battery consumption for commands since 'up' was not properly tested and needed a special case.
-    command_battery = {'takeoff': df.loc[df['Command'] == 'takeoff', 'Battery Consumption (%)'].iloc[0],
-                       'land': df.loc[df['Command'] == 'land', 'Battery Consumption (%)'].iloc[0],
-                       'up': 1.01,
-                       'down': df.loc[df['Command'] == 'down', 'Battery Consumption (%)'].iloc[0],
-                       'forward': df.loc[df['Command'] == 'forward', 'Battery Consumption (%)'].iloc[0],
-                       'back': df.loc[df['Command'] == 'back', 'Battery Consumption (%)'].iloc[0],
-                       'left': df.loc[df['Command'] == 'left', 'Battery Consumption (%)'].iloc[0],
-                       'right': df.loc[df['Command'] == 'right', 'Battery Consumption (%)'].iloc[0],
-                       'cw': df.loc[df['Command'] == 'cw', 'Battery Consumption (%)'].iloc[0],
-                       'ccw': df.loc[df['Command'] == 'ccw', 'Battery Consumption (%)'].iloc[0],
-                       'flip': df.loc[df['Command'] == 'flip', 'Battery Consumption (%)'].iloc[0]}
-
-    simulated_drone = SimulatedTello(command_battery)
+    command_battery = ConsumptionModel.load('./average_battery_consumption/average_battery_data.csv')
+
+    simulated_drone = SimulatedTello(command_battery, load_default_grid(), PrintSink())
 
     app = QApplication(sys.argv)
     gui = DroneGUI(simulated_drone)
@@ -1,69 +1,66 @@
 import time
 import math
 import heapq
-import plotly.graph_objects as go
-import pandas as pd
+from drone_commands import commands, command_ids, command_delta_tuples, command_methods
+from event_log import NullSink, PrintSink
 
 # Simulated Tello Drone class
 # All battery consumption values have been taken from test data.
 class SimulatedTello:
-    def __init__(self, battery_consumption):
+    # Every command is emitted to events (see event_log); by default they are dropped. grid is an
+    # optional OccupancyGrid whose blocked cells can't be flown into.
+    def __init__(self, battery_consumption, events=None, grid=None):
         self.battery_percentage = 100
         self.battery_consumption = battery_consumption
         self.position = (0,0,0,0)
+        self.events = NullSink() if events is None else events
+        self.grid = grid
+
+    # Applies a command's (x, y, z, bearing) change and battery use. A move into a blocked cell
+    # is refused and leaves the drone and its battery as they were.
+    def execute(self, command, message):
+        battery_before = self.battery_percentage
+        dx, dy, dz, turn = command_delta_tuples[command_ids[command]]
+        position = (self.position[0] + dx, self.position[1] + dy, self.position[2] + dz, self.position[3] + turn)
+        if (dx or dy or dz) and self.grid is not None and self.grid.is_blocked(position[:3]):
+            self.events.emit(command, battery_before, battery_before, self.position, "Path is blocked. Cannot execute move.")
+            return
+        self.position = position
+        self.battery_percentage -= self.battery_consumption[command]
+        self.events.emit(command, battery_before, self.battery_percentage, self.position, message)
 
     def takeoff(self):
-        print("Drone is taking off.")
-        self.battery_percentage -= self.battery_consumption['takeoff']
+        self.execute('takeoff', "Drone is taking off.")
 
     def land(self):
-        print("Drone is landing.")
-        self.battery_percentage -= self.battery_consumption['land']
+        self.execute('land', "Drone is landing.")
 
-    # Battery consumption of 'up' hardcoded as it wasn't properly tested.
     def move_up(self):
-        print("Drone is moving up.")
-        self.position = (self.position[0], self.position[1], self.position[2] + 1, self.position[3])
-        self.battery_percentage -= 1.01 
+        self.execute('up', "Drone is moving up.")
 
     def move_down(self):
-        print("Drone is moving down.")
-        self.position = (self.position[0], self.position[1], self.position[2] - 1, self.position[3])
-        self.battery_percentage -= self.battery_consumption['down']
+        self.execute('down', "Drone is moving down.")
 
     def move_forward(self):
-        print("Drone is moving forward.")
-        self.position = (self.position[0] + 1, self.position[1], self.position[2], self.position[3])
-        self.battery_percentage -= self.battery_consumption['forward']
+        self.execute('forward', "Drone is moving forward.")
 
     def move_backward(self):
-        print("Drone is moving backward.")
-        self.position = (self.position[0] - 1, self.position[1], self.position[2], self.position[3])
-        self.battery_percentage -= self.battery_consumption['back']
+        self.execute('back', "Drone is moving backward.")
 
     def move_left(self):
-        print("Drone is moving left.")
-        self.position = (self.position[0], self.position[1] - 1, self.position[2], self.position[3])
-        self.battery_percentage -= self.battery_consumption['left']
+        self.execute('left', "Drone is moving left.")
 
     def move_right(self):
-        print("Drone is moving right.")
-        self.position = (self.position[0], self.position[1] + 1, self.position[2], self.position[3])
-        self.battery_percentage -= self.battery_consumption['right']
+        self.execute('right', "Drone is moving right.")
 
     def rotate_clockwise(self):
-        print("Drone is rotating clockwise.")
-        self.position = (self.position[0], self.position[1], self.position[2], self.position[3] + 1)
-        self.battery_percentage -= self.battery_consumption['cw']
+        self.execute('cw', "Drone is rotating clockwise.")
 
     def rotate_counterclockwise(self):
-        print("Drone is rotating counterclockwise.")
-        self.position = (self.position[0], self.position[1], self.position[2], self.position[3] - 1)
-        self.battery_percentage -= self.battery_consumption['ccw']
+        self.execute('ccw', "Drone is rotating counterclockwise.")
 
     def flip(self):
-        print("Drone is flipping forward.")
-        self.battery_percentage -= self.battery_consumption['flip']
+        self.execute('flip', "Drone is flipping forward.")
 
     def print_battery_status(self):
         print(f"Battery Percentage: {self.battery_percentage}%")
@@ -72,7 +69,8 @@ class SimulatedTello:
         print("Available Commands:")
         print("takeoff, land, up, down, forward, back, left, right, cw, ccw, flip, exit")
 
-def keyboard_control(drone):
+# delay is an optional pause (s) after each command.
+def keyboard_control(drone, delay=0):
     drone.print_available_commands()
 
     while True:
@@ -80,75 +78,251 @@ def keyboard_control(drone):
 
         if command == 'exit':
             break
-        elif command == 'takeoff':
-            drone.takeoff()
-        elif command == 'land':
-            drone.land()
-        elif command == 'up':
-            drone.move_up()
-        elif command == 'down':
-            drone.move_down()
-        elif command == 'forward':
-            drone.move_forward()
-        elif command == 'back':
-            drone.move_backward()
-        elif command == 'left':
-            drone.move_left()
-        elif command == 'right':
-            drone.move_right()
-        elif command == 'cw':
-            drone.rotate_clockwise()
-        elif command == 'ccw':
-            drone.rotate_counterclockwise()
-        elif command == 'flip':
-            drone.flip()
+        elif command in command_ids:
+            getattr(drone, command_methods[command_ids[command]])()
         else:
             print("Invalid command.")
 
         drone.print_battery_status()
-        time.sleep(1)
+        if delay:
+            time.sleep(delay)
+
+# Change in (x, y, z, bearing) for each planner move. Bearing is counted in quarter turns.
+# takeoff, land and flip leave the state unchanged, so the planner never considers them.
+move_deltas = {command: command_delta_tuples[command_ids[command]] for command in commands
+               if any(command_delta_tuples[command_ids[command]])}
+num_bearings = 4
 
 # A star path planning algorithm for best path.
-def heuristic_cost_estimate(start, goal):
-    return abs(goal[0] - start[0]) + abs(goal[1] - start[1]) + abs(goal[2] - start[2]) + abs(goal[3] - start[3])
+# Moves along each axis are independent, so charging every remaining step at the cost of the
+# move that closes it (and the cheaper turn direction for the bearing) never overestimates.
+def heuristic_cost_estimate(start, goal, step_costs):
+    return position_cost_estimate(start, goal, step_costs) + turn_cost_estimate(start[3], goal[3], step_costs)
+
+def position_cost_estimate(start, goal, step_costs):
+    dx = goal[0] - start[0]
+    dy = goal[1] - start[1]
+    dz = goal[2] - start[2]
+    cost = dx * step_costs['forward'] if dx > 0 else -dx * step_costs['back']
+    cost += dy * step_costs['right'] if dy > 0 else -dy * step_costs['left']
+    cost += dz * step_costs['up'] if dz > 0 else -dz * step_costs['down']
+    return cost
+
+def turn_cost_estimate(start_bearing, goal_bearing, step_costs):
+    return min(step_costs[move] * count for move, count in turn_options(start_bearing, goal_bearing))
+
+# The two ways of turning from one bearing to another: cw turns or ccw turns.
+def turn_options(start_bearing, goal_bearing):
+    turns = (goal_bearing - start_bearing) % num_bearings
+    return [('cw', turns), ('ccw', (num_bearings - turns) % num_bearings)]
 
 # Calculate the cost based on movement cost and battery consumption
 def cost_function(move, command_battery):
     movement_cost = 1
-    if move == 'up':
-        battery_cost = 1.01
-    else:
-        battery_cost = command_battery[move]
+    battery_cost = command_battery[move]
     total_cost = movement_cost + battery_cost
     return total_cost
 
-def astar_search(start, goal, drone, command_battery):
-    open_set = []
+def in_bounds(position, bounds):
+    if bounds is None:
+        return True
+    return 0 <= position[0] < bounds[0] and 0 <= position[1] < bounds[1] and 0 <= position[2] < bounds[2]
+
+# Returns a test for whether an (x, y, z) cell can be entered: inside bounds, if given, and not
+# blocked in grid, if given.
+def free_cell_test(bounds, grid):
+    if grid is None:
+        return lambda position: in_bounds(position, bounds)
+    if bounds is None:
+        return lambda position: not grid.is_blocked(position)
+    return lambda position: in_bounds(position, bounds) and not grid.is_blocked(position)
+
+# Search modes accepted by plan_path:
+#   astar          optimal A*
+#   weighted       A* with the heuristic scaled by weight; paths cost at most weight times the optimum
+#   bidirectional  optimal bidirectional A* (searches from both ends with averaged potentials).
+#                  Not a speed-up: the averaged potentials guide each side less than astar's
+#                  heuristic, so it expands more nodes than astar on open and walled grids alike
+#                  (about 1.7x on an 80x80x20 grid with two walls). Use jump for large grids.
+#   jump           A* over straight runs that only stop where a turn can matter (goal alignment,
+#                  walls and openings in the occupancy grid), falling back to astar if it finds nothing
+search_modes = ['astar', 'weighted', 'bidirectional', 'jump']
+
+# Moves that change the (x, y, z) position, with their deltas.
+position_moves = [(action, delta[:3]) for action, delta in move_deltas.items() if any(delta[:3])]
+
+def reconstruct_path(came_from, state):
+    path = []
+    while came_from[state] is not None:
+        state, action, steps = came_from[state]
+        path.extend([action] * steps)
+    path.reverse()
+    return path
+
+# Plans a path over (x, y, z, bearing) states with cost_function as the edge weight, avoiding cells
+# outside bounds (an optional (x, y, z) grid size) and cells blocked in grid (an OccupancyGrid).
+# Movement doesn't depend on the bearing, so the position is searched on its own and the cheapest
+# turns to the goal bearing are added at the end.
+# Returns the list of moves, or None if the goal can't be reached, and the number of nodes expanded.
+def plan_path(start, goal, command_battery, bounds=None, grid=None, mode='astar', weight=1.5):
+    if mode not in search_modes:
+        raise ValueError(f"Unknown search mode: {mode}")
+    is_free = free_cell_test(bounds, grid)
+    start_position = tuple(start[:3])
+    goal_position = tuple(goal[:3])
+    if not is_free(start_position) or not is_free(goal_position):
+        return None, 0
+
+    step_costs = {move: cost_function(move, command_battery) for move in move_deltas}
+    if mode == 'bidirectional':
+        path, expanded = bidirectional_search(start_position, goal_position, step_costs, is_free)
+    elif mode == 'jump':
+        path, expanded = best_first_search(start_position, goal_position, step_costs, is_free, 1.0, jump=grid is not None or bounds is not None)
+        if path is None:
+            path, fallback_expanded = best_first_search(start_position, goal_position, step_costs, is_free, 1.0)
+            expanded += fallback_expanded
+    else:
+        path, expanded = best_first_search(start_position, goal_position, step_costs, is_free,
+                                           weight if mode == 'weighted' else 1.0)
+
+    if path is not None:
+        turn, count = min(turn_options(start[3], goal[3]), key=lambda option: step_costs[option[0]] * option[1])
+        path += [turn] * count
+    return path, expanded
+
+# Searches (x, y, z, bearing) states with cost_function as the edge weight and returns the
+# list of moves for the cheapest path, or None if the goal can't be reached.
+# bounds is an optional (x, y, z) grid size; cells outside 0..size-1 are never entered. grid is an
+# optional OccupancyGrid of blocked cells. See search_modes for mode.
+def astar_search(start, goal, drone, command_battery, bounds=None, grid=None, mode='astar', weight=1.5):
+    return plan_path(start, goal, command_battery, bounds, grid, mode, weight)[0]
+
+# Neighbouring cells as (cell, action, number of steps) with each move taken once.
+def single_steps(position, goal, is_free):
+    for action, (dx, dy, dz) in position_moves:
+        new_position = (position[0] + dx, position[1] + dy, position[2] + dz)
+        if is_free(new_position):
+            yield new_position, action, 1
+
+# Like single_steps, but each move keeps going in a straight line and only stops on the goal's
+# plane along that axis, before a blocked cell, or where a cell beside the run changes between
+# free and blocked (where a turn could reach somewhere a turn one cell earlier couldn't).
+def jump_steps(position, goal, is_free):
+    for action, delta in position_moves:
+        axis = 0 if delta[0] else 1 if delta[1] else 2
+        sides = [side for side in side_offsets if not side[axis]]
+        x, y, z = position
+        dx, dy, dz = delta
+        side_free = [is_free((x + sx, y + sy, z + sz)) for sx, sy, sz in sides]
+        steps = 0
+        while is_free((x + dx, y + dy, z + dz)):
+            x, y, z = x + dx, y + dy, z + dz
+            steps += 1
+            if (x, y, z)[axis] == goal[axis]:
+                break
+            new_side_free = [is_free((x + sx, y + sy, z + sz)) for sx, sy, sz in sides]
+            if new_side_free != side_free:
+                break
+        if steps:
+            yield (x, y, z), action, steps
+
+side_offsets = [(1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1)]
+
+# A* over cells from single_steps (or jump_steps), with the heuristic scaled by weight.
+def best_first_search(start, goal, step_costs, is_free, weight, jump=False):
+    successors = jump_steps if jump else single_steps
+    g_costs = {start: 0}
+    came_from = {start: None}
     closed_set = set()
-    heapq.heappush(open_set, (0, start, []))
+    counter = 0
+    expanded = 0
+    # Ties on f are broken towards the deeper node so equal-cost detours aren't all expanded.
+    # f is rounded first so floating point noise between equal-cost orderings doesn't break the tie.
+    open_set = [(weight * position_cost_estimate(start, goal, step_costs), 0, counter, start)]
 
     while open_set:
-        f_cost, current_position, path = heapq.heappop(open_set)
+        f_cost, neg_g_cost, _, current_position = heapq.heappop(open_set)
 
         if current_position == goal:
-            return path
+            return reconstruct_path(came_from, current_position), expanded
 
         if current_position in closed_set:
             continue
 
         closed_set.add(current_position)
-
-        movements = ['up', 'down', 'forward', 'back', 'left', 'right', 'cw', 'ccw', 'flip']
-
-        for action in movements:
-            new_position = current_position + (action,)
-            new_path = path + [action]
-            g_cost = len(new_path)
-            h_cost = heuristic_cost_estimate(new_position, goal)
-            f_cost = g_cost + h_cost + cost_function(action, command_battery)
-            heapq.heappush(open_set, (f_cost, new_position, new_path))
-
-    return None
+        expanded += 1
+        g_cost = -neg_g_cost
+
+        for new_position, action, steps in successors(current_position, goal, is_free):
+            if new_position in closed_set:
+                continue
+            new_g_cost = g_cost + steps * step_costs[action]
+            if new_g_cost >= g_costs.get(new_position, float('inf')):
+                continue
+            g_costs[new_position] = new_g_cost
+            came_from[new_position] = (current_position, action, steps)
+            counter += 1
+            f_cost = round(new_g_cost + weight * position_cost_estimate(new_position, goal, step_costs), 9)
+            heapq.heappush(open_set, (f_cost, -new_g_cost, counter, new_position))
+
+    return None, expanded
+
+# Bidirectional A*: a forward search from start and a backward search from goal, both on costs
+# reduced by the average potential (h_goal - h_start) / 2 so the two heuristics stay consistent
+# with each other. It stops once the smallest keys on both sides add up to the best meeting cost.
+def bidirectional_search(start, goal, step_costs, is_free):
+    if start == goal:
+        return [], 0
+
+    def potential(position):
+        return (position_cost_estimate(position, goal, step_costs) - position_cost_estimate(start, position, step_costs)) / 2
+
+    g_costs = ({start: 0}, {goal: 0})
+    links = ({start: None}, {goal: None})
+    closed_sets = (set(), set())
+    open_sets = ([(round(potential(start), 9), 0, 0, start)], [(round(-potential(goal), 9), 0, 0, goal)])
+    best_cost = float('inf')
+    meeting_position = None
+    counter = 0
+    expanded = 0
+
+    while open_sets[0] and open_sets[1]:
+        if open_sets[0][0][0] + open_sets[1][0][0] >= best_cost - 1e-6:
+            break
+        side = 0 if open_sets[0][0][0] <= open_sets[1][0][0] else 1
+        _, neg_g_cost, _, position = heapq.heappop(open_sets[side])
+        if position in closed_sets[side]:
+            continue
+        closed_sets[side].add(position)
+        expanded += 1
+        g_cost = -neg_g_cost
+
+        # The backward search follows moves in reverse, from a cell to its predecessors.
+        sign = 1 if side == 0 else -1
+        for action, (dx, dy, dz) in position_moves:
+            new_position = (position[0] + sign * dx, position[1] + sign * dy, position[2] + sign * dz)
+            if new_position in closed_sets[side] or not is_free(new_position):
+                continue
+            new_g_cost = g_cost + step_costs[action]
+            if new_g_cost >= g_costs[side].get(new_position, float('inf')):
+                continue
+            g_costs[side][new_position] = new_g_cost
+            links[side][new_position] = (position, action, 1)
+            counter += 1
+            key = round(new_g_cost + sign * potential(new_position), 9)
+            heapq.heappush(open_sets[side], (key, -new_g_cost, counter, new_position))
+            if new_position in g_costs[1 - side] and new_g_cost + g_costs[1 - side][new_position] < best_cost:
+                best_cost = new_g_cost + g_costs[1 - side][new_position]
+                meeting_position = new_position
+
+    if meeting_position is None:
+        return None, expanded
+    path = reconstruct_path(links[0], meeting_position)
+    position = meeting_position
+    while links[1][position] is not None:
+        position, action, _ = links[1][position]
+        path.append(action)
+    return path, expanded
 
 def get_destination_input():
     while True:
@@ -162,30 +336,20 @@ def get_destination_input():
             print("Invalid input. Please enter integers.")
 
 # Plot best path.
+# numpy, plotly and the consumption data are imported where they're used, so planning from the
+# command line (see drone_cli.py) doesn't pay for them.
 def plot_path(path):
+    import numpy as np
+    import plotly.graph_objects as go
+    from drone_commands import command_deltas, encode_commands
     if path:
-        x_coords = [0]
-        y_coords = [0]
-        z_coords = [0]
-
-        for action in path:
-            if action == 'up':
-                z_coords.append(z_coords[-1] + 1)
-            elif action == 'down':
-                z_coords.append(z_coords[-1] - 1)
-            elif action == 'forward':
-                x_coords.append(x_coords[-1] + 1)
-            elif action == 'back':
-                x_coords.append(x_coords[-1] - 1)
-            elif action == 'left':
-                y_coords.append(y_coords[-1] - 1)
-            elif action == 'right':
-                y_coords.append(y_coords[-1] + 1)
+        positions = np.zeros((len(path) + 1, 4), dtype=np.int32)
+        np.cumsum(command_deltas[encode_commands(path)], axis=0, out=positions[1:])
 
         fig = go.Figure(data=[go.Scatter3d(
-            x=x_coords,
-            y=y_coords,
-            z=z_coords,
+            x=positions[:, 0],
+            y=positions[:, 1],
+            z=positions[:, 2],
             mode='lines+markers',
             marker=dict(size=5),
             line=dict(color='blue', width=2)
@@ -205,20 +369,23 @@ def plot_path(path):
         print("No valid path found.")
 
 def main():
-    csv_file = './average_battery_consumption/average_battery_data.csv'
-    df = pd.read_csv(csv_file)
-    commands = ['back', 'ccw', 'cw', 'down', 'flip', 'forward', 'land', 'left', 'right', 'takeoff']
-    command_battery = {cmd: df.loc[df['Command'] == cmd, 'Battery Consumption (%)'].iloc[0] for cmd in commands}
+    from consumption_model import ConsumptionModel
+    from occupancy_grid import load_default_grid
+    command_battery = ConsumptionModel.load('./average_battery_consumption/average_battery_data.csv')
     
-    simulated_drone = SimulatedTello(command_battery)
+    grid = load_default_grid()
+    simulated_drone = SimulatedTello(command_battery, PrintSink(), grid)
 
     print("Please input the destination coordinates for the drone:")
     destination = get_destination_input()
 
     start_position = (0, 0, 0, 0)
-    path = astar_search(start_position, destination, simulated_drone, command_battery)
+    path = astar_search(start_position, destination, simulated_drone, command_battery, grid=grid)
     
-    plot_path(path)
+    if path is None:
+        print("No path to the destination avoids the occupancy grid's obstacles.")
+    else:
+        plot_path(path)
     
     keyboard_control(simulated_drone)
 
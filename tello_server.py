@@ -0,0 +1,289 @@
+import sys
+import time
+import asyncio
+import argparse
+from collections import deque
+from consumption_model import ConsumptionModel
+from drone_commands import command_ids, command_methods
+from event_log import NullSink
+from simulated_tello import SimulatedTello
+
+# Emulates the Tello SDK's UDP text protocol for many SimulatedTello drones at once, so ground
+# control software can be load-tested without real hardware. Each drone listens on its own
+# address; after a client sends 'command' the drone answers its commands from that socket and
+# streams state packets to the client's state_port.
+
+command_port = 8889
+state_port = 8890
+base_port = 11000
+
+# State packets per second sent to every connected client.
+state_rate = 10
+
+# One simulator cell is cell_cm centimetres, and one bearing step turn_degrees. An SDK move is
+# flown as that many simulator moves (at least one) and charged for each of them.
+cell_cm = 20
+turn_degrees = 90
+
+# Latencies kept per drone for percentiles.
+latency_samples = 1024
+
+moves = ['up', 'down', 'forward', 'back', 'left', 'right']
+turns = ['cw', 'ccw']
+
+# One virtual drone: the simulator plus the SDK-level state it doesn't model (SDK mode, yaw,
+# speed, flight time) and per-drone metrics.
+class VirtualDrone:
+    def __init__(self, index, battery_consumption):
+        self.index = index
+        self.drone = SimulatedTello(battery_consumption, events=NullSink())
+        self.client = None
+        self.yaw = 0
+        self.speed = 100
+        self.takeoff_time = None
+        self.flight_seconds = 0.0
+        self.commands = 0
+        self.errors = 0
+        self.state_packets = 0
+        self.latencies = deque(maxlen=latency_samples)
+        self.started = time.perf_counter()
+
+    # Flies command count times, or none of them: a move that would be refused partway (on the
+    # ground, into a blocked cell, or past an empty battery) is rejected before anything is
+    # charged. Landing is always allowed.
+    def run(self, command, count=1):
+        drone = self.drone
+        if command != 'land':
+            if drone.battery_percentage < drone.battery_consumption[command] * count:
+                return 'error Not enough battery'
+            if command != 'takeoff':
+                if drone.landed:
+                    return 'error Not flying'
+                position = drone.position
+                for _ in range(count):
+                    position = drone.get_new_position(command, position)
+                    if drone.is_blocked(position):
+                        return 'error Path blocked'
+        method = getattr(drone, command_methods[command_ids[command]])
+        for _ in range(count):
+            if not method():
+                return 'error'
+        return 'ok'
+
+    def handle(self, text):
+        parts = text.split()
+        if not parts:
+            return 'error'
+        command, arguments = parts[0].lower(), parts[1:]
+        if command == 'command':
+            return 'ok'
+        if self.client is None:
+            return 'error Not in SDK mode'
+        if command.endswith('?'):
+            return self.query(command[:-1])
+        if command == 'takeoff':
+            response = self.run('takeoff')
+            if response == 'ok':
+                self.takeoff_time = time.monotonic()
+            return response
+        if command in ('land', 'emergency'):
+            if command == 'emergency':
+                self.drone.landed = True
+                self.drone.position = (0, 0, 0)
+                response = 'ok'
+            else:
+                response = self.run('land')
+            if response == 'ok' and self.takeoff_time is not None:
+                self.flight_seconds += time.monotonic() - self.takeoff_time
+                self.takeoff_time = None
+            return response
+        if command in ('streamon', 'streamoff', 'stop'):
+            return 'ok'
+        try:
+            value = int(arguments[0]) if arguments and command != 'flip' else None
+        except ValueError:
+            return 'error'
+        if command in moves and value is not None and 20 <= value <= 500:
+            return self.run(command, max(1, round(value / cell_cm)))
+        if command in turns and value is not None and 1 <= value <= 360:
+            steps = max(1, round(value / turn_degrees))
+            response = self.run(command, steps)
+            if response == 'ok':
+                self.yaw = (self.yaw + (steps if command == 'cw' else -steps) * turn_degrees + 180) % 360 - 180
+            return response
+        if command == 'flip' and arguments and arguments[0] in ('l', 'r', 'f', 'b'):
+            return self.run('flip')
+        if command == 'speed' and value is not None and 10 <= value <= 100:
+            self.speed = value
+            return 'ok'
+        return 'error'
+
+    def query(self, name):
+        if name == 'battery':
+            return str(self.battery())
+        if name == 'speed':
+            return f'{self.speed:.1f}'
+        if name == 'time':
+            return f'{round(self.flight_time())}s'
+        if name == 'height':
+            return f'{round(self.height_cm() / 10)}dm'
+        if name == 'attitude':
+            return f'pitch:0;roll:0;yaw:{self.yaw};'
+        if name == 'temp':
+            return '60~62C'
+        if name == 'tof':
+            return f'{self.height_cm() * 10 + 100}mm'
+        if name == 'baro':
+            return f'{self.height_cm() / 100:.2f}'
+        if name == 'wifi':
+            return '90'
+        if name == 'sdk':
+            return '20'
+        if name == 'sn':
+            return f'0TQSIM{self.index:06d}'
+        return 'error'
+
+    def battery(self):
+        return max(0, int(round(self.drone.battery_percentage)))
+
+    def height_cm(self):
+        return 0 if self.drone.landed else self.drone.position[2] * cell_cm
+
+    def flight_time(self):
+        if self.takeoff_time is None:
+            return self.flight_seconds
+        return self.flight_seconds + time.monotonic() - self.takeoff_time
+
+    def state_packet(self):
+        height = round(self.height_cm())
+        return (f'pitch:0;roll:0;yaw:{self.yaw};vgx:0;vgy:0;vgz:0;templ:60;temph:62;'
+                f'tof:{height * 10 + 100};h:{height};bat:{self.battery()};baro:{height / 100:.2f};'
+                f'time:{round(self.flight_time())};agx:0.00;agy:0.00;agz:-1000.00;\r\n').encode()
+
+    def metrics(self):
+        latencies = sorted(self.latencies)
+        elapsed = time.perf_counter() - self.started
+        return {'drone': self.index, 'client': self.client, 'commands': self.commands, 'errors': self.errors,
+                'state_packets': self.state_packets, 'battery': self.battery(),
+                'commands_per_second': self.commands / elapsed if elapsed > 0 else 0.0,
+                'mean_latency_us': 1e6 * sum(latencies) / len(latencies) if latencies else 0.0,
+                'p99_latency_us': 1e6 * latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] if latencies else 0.0}
+
+# Answers SDK commands for one drone. Latency is measured from receipt to the reply being handed
+# to the socket.
+class TelloProtocol(asyncio.DatagramProtocol):
+    def __init__(self, virtual_drone):
+        self.virtual_drone = virtual_drone
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        start = time.perf_counter()
+        drone = self.virtual_drone
+        text = data.decode(errors='replace').strip()
+        if text.lower() == 'command':
+            drone.client = address
+        response = drone.handle(text)
+        drone.commands += 1
+        if response.startswith('error'):
+            drone.errors += 1
+        self.transport.sendto(response.encode(), address)
+        drone.latencies.append(time.perf_counter() - start)
+
+# Hosts num_drones virtual drones. By default they share host on consecutive ports from
+# first_port; with distinct_hosts each gets its own loopback address (127.0.x.y) on the real SDK
+# port, which Linux routes without any configuration.
+class TelloServer:
+    def __init__(self, battery_consumption, num_drones, host='127.0.0.1', first_port=base_port,
+                 distinct_hosts=False, rate=state_rate, client_state_port=state_port):
+        self.drones = [VirtualDrone(index, battery_consumption) for index in range(num_drones)]
+        if distinct_hosts:
+            self.addresses = [(f'127.0.{1 + index // 254}.{1 + index % 254}', command_port) for index in range(num_drones)]
+        else:
+            self.addresses = [(host, first_port + index) for index in range(num_drones)]
+        self.rate = rate
+        self.client_state_port = client_state_port
+        self.protocols = []
+        self.state_task = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        for drone, address in zip(self.drones, self.addresses):
+            _, protocol = await loop.create_datagram_endpoint(lambda drone=drone: TelloProtocol(drone), local_addr=address)
+            self.protocols.append(protocol)
+        if self.rate:
+            self.state_task = asyncio.create_task(self.stream_state())
+
+    # One task sends every connected drone's state packet each tick, keeping a steady rate
+    # whatever the number of drones.
+    async def stream_state(self):
+        interval = 1.0 / self.rate
+        next_tick = time.monotonic()
+        while True:
+            for protocol in self.protocols:
+                drone = protocol.virtual_drone
+                if drone.client is not None:
+                    protocol.transport.sendto(drone.state_packet(), (drone.client[0], self.client_state_port))
+                    drone.state_packets += 1
+            next_tick += interval
+            await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+
+    def metrics(self):
+        return [drone.metrics() for drone in self.drones]
+
+    # Fleet-wide totals plus the slowest drone's 99th percentile latency.
+    def summary(self):
+        metrics = self.metrics()
+        active = [row for row in metrics if row['commands']]
+        return {'drones': len(metrics), 'active': len(active),
+                'commands': sum(row['commands'] for row in metrics),
+                'errors': sum(row['errors'] for row in metrics),
+                'state_packets': sum(row['state_packets'] for row in metrics),
+                'commands_per_second': sum(row['commands_per_second'] for row in metrics),
+                'worst_p99_latency_us': max((row['p99_latency_us'] for row in active), default=0.0)}
+
+    async def close(self):
+        if self.state_task is not None:
+            self.state_task.cancel()
+            try:
+                await self.state_task
+            except asyncio.CancelledError:
+                pass
+        for protocol in self.protocols:
+            protocol.transport.close()
+
+async def serve(args):
+    server = TelloServer(ConsumptionModel.load(), args.drones, args.host, args.first_port,
+                         args.distinct_hosts, args.state_rate, args.state_port)
+    await server.start()
+    first, last = server.addresses[0], server.addresses[-1]
+    print(f'Serving {args.drones} virtual Tellos on {first[0]}:{first[1]} .. {last[0]}:{last[1]}')
+    try:
+        while True:
+            await asyncio.sleep(args.report_every)
+            summary = server.summary()
+            print(f"{summary['active']}/{summary['drones']} drones active, {summary['commands']} commands "
+                  f"({summary['errors']} errors), {summary['commands_per_second']:.0f} commands/s, "
+                  f"{summary['state_packets']} state packets, worst p99 latency {summary['worst_p99_latency_us']:.0f} us")
+    finally:
+        await server.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve virtual Tello drones over the SDK UDP protocol.')
+    parser.add_argument('--drones', type=int, default=1)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--first-port', type=int, default=base_port)
+    parser.add_argument('--distinct-hosts', action='store_true', help='one 127.0.x.y address per drone on port 8889')
+    parser.add_argument('--state-rate', type=float, default=state_rate)
+    parser.add_argument('--state-port', type=int, default=state_port)
+    parser.add_argument('--report-every', type=float, default=5.0)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+if __name__ == "__main__":
+    main()